@@ -0,0 +1,72 @@
+#!/bin/sh
+#
+# Prepares the Java support files baked into the judge image:
+#   - /course/lib/judge-support.jar: precompiled Runner and Translator classes,
+#     so that they are not recompiled for every submission;
+#   - /course/cds/judge.jsa: a class-data-sharing archive covering the grading
+#     classpath, picked up by runfile.py when it exists.
+#
+# The archive is trained on cds/CdsTraining.java, a test using JUnit, hamcrest
+# and mockito (with cglib, objenesis and ASM). It is optional: if the JVM of the
+# image cannot dump it, or if the JUnit and mockito classes are not loaded from
+# it afterwards (-verbose:class), it is removed and the grading falls back to a
+# regular startup.
+#
+# CLASSPATH must stay a prefix of the one built by librairies() in runfile.py,
+# otherwise the JVM refuses to use the archive.
+
+set -e
+
+COURSE=/course
+SUPPORT_JAR=$COURSE/lib/judge-support.jar
+CDS_ARCHIVE=$COURSE/cds/judge.jsa
+
+CLASSPATH=/usr/share/java/junit.jar
+CLASSPATH=$CLASSPATH:/usr/share/java/hamcrest/core.jar
+CLASSPATH=$CLASSPATH:/usr/share/java/mockito/mockito-core.jar
+CLASSPATH=$CLASSPATH:/usr/share/java/cglib/cglib.jar
+CLASSPATH=$CLASSPATH:/usr/share/java/objenesis/objenesis.jar
+CLASSPATH=$CLASSPATH:/usr/share/java/objectweb-asm/asm-all.jar
+CLASSPATH=$CLASSPATH:$SUPPORT_JAR
+
+BUILD_DIR=$(mktemp -d)
+trap 'rm -rf "$BUILD_DIR"' EXIT
+
+# Precompiled support classes
+mkdir -p "$(dirname "$SUPPORT_JAR")"
+# The training test is in the jar too: the classpath of the training run must be
+# the one of the archive, itself a prefix of the classpath of the gradings.
+javac -d "$BUILD_DIR/classes" -encoding UTF8 -cp "$CLASSPATH" \
+    $COURSE/src/Runner.java \
+    $COURSE/student/Translations/Translator.java \
+    $COURSE/cds/CdsTraining.java
+jar cf "$SUPPORT_JAR" -C "$BUILD_DIR/classes" .
+
+# Class-data-sharing archive, trained on CdsTraining (Runner exits with 127 when it passes).
+# The runs happen in the build directory, where Runner writes its runner_results.txt.
+cd "$BUILD_DIR"
+JAVA_OPTS="-XX:+UnlockDiagnosticVMOptions -cp $CLASSPATH"
+dump_archive() {
+    java $JAVA_OPTS -Xshare:off -XX:DumpLoadedClassList="$BUILD_DIR/classes.lst" src.Runner CdsTraining
+    [ $? -eq 127 ] || return 1
+    java $JAVA_OPTS -Xshare:dump -XX:SharedClassListFile="$BUILD_DIR/classes.lst" \
+        -XX:SharedArchiveFile="$CDS_ARCHIVE" || return 1
+    java $JAVA_OPTS -Xshare:on -XX:SharedArchiveFile="$CDS_ARCHIVE" -verbose:class \
+        src.Runner CdsTraining > "$BUILD_DIR/classes.log"
+    [ $? -eq 127 ] || return 1
+    # Java 8 logs "<class> from shared objects file", later versions "<class> source: shared objects file"
+    for class in org.junit.runner.JUnitCore org.hamcrest.CoreMatchers org.mockito.Mockito; do
+        if ! grep -Eq "$class (from|source:) shared objects file" "$BUILD_DIR/classes.log"; then
+            echo "$class is not loaded from the CDS archive"
+            return 1
+        fi
+    done
+}
+
+mkdir -p "$(dirname "$CDS_ARCHIVE")"
+if dump_archive; then
+    echo "CDS archive written to $CDS_ARCHIVE"
+else
+    echo "Could not build a usable CDS archive, JVM startup will not use one"
+    rm -f "$CDS_ARCHIVE"
+fi
@@ -0,0 +1,46 @@
+/**
+ *  This program is free software: you can redistribute it and/or modify
+ *  it under the terms of the GNU Affero General Public License as published by
+ *  the Free Software Foundation, either version 3 of the License, or
+ *  (at your option) any later version.
+ *  This program is distributed in the hope that it will be useful,
+ *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+ *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ *  GNU Affero General Public License for more details.
+ *
+ *  You should have received a copy of the GNU Affero General Public License
+ *  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+package src;
+
+import static org.hamcrest.CoreMatchers.equalTo;
+import static org.hamcrest.CoreMatchers.is;
+import static org.junit.Assert.assertEquals;
+import static org.junit.Assert.assertThat;
+import static org.mockito.Mockito.mock;
+import static org.mockito.Mockito.verify;
+import static org.mockito.Mockito.when;
+
+import java.util.List;
+
+import org.junit.Test;
+
+/*
+ * Training run of the class-data-sharing archive built by build_support.sh.
+ * It goes through JUnit, hamcrest and a mockito mock (generated with cglib,
+ * objenesis and ASM), so that the classes the tests of the tasks load are
+ * part of the archive. It is not a test of the course.
+ */
+public class CdsTraining {
+
+	@Test
+	@SuppressWarnings("unchecked")
+	public void training() {
+		List<String> list = mock(List.class);
+		when(list.get(0)).thenReturn("judge");
+		assertThat(list.get(0), is(equalTo("judge")));
+		verify(list).get(0);
+		assertEquals(1, list.size() + 1);
+	}
+}
@@ -22,11 +22,16 @@ import subprocess
 import shlex
 import sys
 import re
+import yaml
 from json import JSONDecodeError
 
 from inginious import feedback
 from inginious import input
 
+# task_common est installé à côté de ce fichier dans l'image (voir Dockerfile)
+sys.path.append(os.environ.get("JUDGE_COMMON", os.path.dirname(os.path.abspath(__file__))))
+import task_common
+
 def initTranslations():
     """ Initialise la fonction _() qui permettra de traduire les chaines de caractère. 
 
@@ -61,26 +66,52 @@ def parsetemplate():
     fois le pattern @@<id-question>@@, la réponse de la question avec l'id <id-question>
     sera placée à la place du pattern et le fichier résultant sera copier dans le dossier
     /task/StudentCode (créer au début de la fonction) avec une extension .java
+
+    Les templates découpés sont gardés par task_common.compiled_template dans le dossier
+    d'état du noeud (JUDGE_STATE_DIR), partagé par toutes les corrections : un template
+    n'est redécoupé que si son contenu ou les questions ont changé. Seuls les marqueurs des
+    questions de l'étudiant sont reconnus (les annotations Java contiennent aussi des @).
     """
     os.mkdir('./StudentCode')
+    answers = input.load_input()['input']
+    problems = sorted(answers)
     for file in os.listdir('./Templates'):
         filename = getfilename(file)
-        input.parse_template('./Templates/' + file,'./StudentCode/' + filename + '.java');
+        segments = task_common.compiled_template('./Templates/' + file, problems)
+        with open('./StudentCode/' + filename + '.java', 'w', encoding="utf-8") as f:
+            f.write(task_common.template_render(segments, answers))
+
+# Fichiers produits par build_support.sh lors de la construction de l'image
+SUPPORT_JAR = '/course/lib/judge-support.jar'
+CDS_ARCHIVE = '/course/cds/judge.jsa'
 
 def librairies():
-    """Définit l'ensemble des pathfile qui seront utilisé via l'option -cp de javac et java """
-    lib = '.'
-    lib += ':/usr/share/java/junit.jar'
+    """Définit l'ensemble des pathfile qui seront utilisé via l'option -cp de javac et java
+
+    Les jars viennent en premier : le classpath utilisé pour générer l'archive CDS
+    dans build_support.sh doit être un préfixe de celui-ci.
+    """
+    lib = '/usr/share/java/junit.jar'
     lib += ':/usr/share/java/hamcrest/core.jar'
     lib += ':/usr/share/java/mockito/mockito-core.jar'
     lib += ':/usr/share/java/cglib/cglib.jar'
     lib += ':/usr/share/java/objenesis/objenesis.jar'
     lib += ':/usr/share/java/objectweb-asm/asm-all.jar'
+    if os.path.exists(SUPPORT_JAR): # Runner et Translator précompilés
+        lib += ':' + SUPPORT_JAR
+    lib += ':.'
     lib += ':./student'
     lib += ':./src'
     lib += ':./StudentCode'
     return lib
 
+def jvm_options():
+    """Options de la JVM, avec l'archive CDS de l'image si elle a pu être générée"""
+    options = '-ea'
+    if os.path.exists(CDS_ARCHIVE):
+        options += ' -XX:+UnlockDiagnosticVMOptions -Xshare:auto -XX:SharedArchiveFile=' + CDS_ARCHIVE
+    return options
+
 def compile_files(test_file):
     """ Compile l'ensemble des fichier .java nécessaire pour les tests
 
@@ -121,7 +152,34 @@ def get_test_files(runner):
             files.append(getfilename(file))
     return files
 
-def run(customscript,execcustom,nexercices,tests=[],runner='Runner'):
+# Résultats de chaque classe de test écrits par le Runner
+RUNNER_RESULTS = 'runner_results.txt'
+
+def task_config():
+    """ Retourne le task.yaml de la tâche, qui l'identifie dans le dossier d'état du noeud (voir task_common.task_id) """
+    for name in ('task.yaml', 'task.yml'):
+        try:
+            with open(name, 'r', encoding="utf-8") as f:
+                return yaml.safe_load(f) or {}
+        except OSError:
+            pass
+    return {}
+
+def read_runner_results(results_file):
+    """ Lit les résultats écrits par le Runner dans results_file
+
+    Retourne, pour chaque classe de test lancée, sa réussite et sa durée (comme task_common.parse_test_results)
+    et la liste des classes qui n'ont pas été lancées (mode fail-fast)
+    """
+    try:
+        with open(results_file, 'r', encoding="utf-8") as f:
+            lines = [line.strip().split('#') for line in f if line.count('#') == 2]
+    except OSError:
+        return {}, []
+    results = {test: (code == 'SUCCESS', float(duration)) for test, code, duration in lines if code != 'NOT_RUN'}
+    return results, [test for test, code, duration in lines if code == 'NOT_RUN']
+
+def run(customscript,execcustom,nexercices,tests=[],runner='Runner',failfast=False):
     """ Parse les réponse des étudiant, compile et lance les tests et donne le feedback aux étudiant
 
     Keyword arguments:
@@ -130,10 +188,13 @@ def run(customscript,execcustom,nexercices,tests=[],runner='Runner'):
     nexercices -- la nombre d'exercice dans la tâche
     tests -- Fichiers de test à lancer
     runner -- Fichier runner (default 'Runner')
+    failfast -- Si vrai, le Runner s'arrête à la première classe de test qui échoue (default False)
     """
     #Récupération des fichiers de tests si jamais il ne sont pas fournis à l'appel de la méthode
     if not tests:
         tests = get_test_files(runner)
+    stats_file = task_common.task_stats_path(task_config()) # Historique des tests, dans le dossier d'état du noeud
+    tests = task_common.order_tests(task_common.load_test_stats(stats_file), tests) # Les tests qui échouent le plus souvent d'abord
     code_litteral = ".. code-block::\n\n"
     parsetemplate() # Parse les réponses de l'étudiant
     if execcustom != 0: # On doit exécuter le script personnalsé
@@ -151,12 +212,15 @@ def run(customscript,execcustom,nexercices,tests=[],runner='Runner'):
     anonymous_fun = lambda file : './src/' + file + '.java' # Create anonymous funcntion
     anonymous_fun_2 = lambda file : '/course/src/' + file + '.java'
     Log = compile_files([anonymous_fun(file) for file in tests] )
-    Log += compile_files([anonymous_fun_2(file) for file in [runner]] )
+    if runner != 'Runner' or not os.path.exists(SUPPORT_JAR): # Le Runner par défaut est déjà compilé dans l'image
+        Log += compile_files([anonymous_fun_2(file) for file in [runner]] )
     if Log == "": # La compilation a réussie
         with open('err.txt', 'w+', encoding="utf-8") as f:
             # On lance le runner
             os.chdir('./student')
-            java_cmd = "run_student java -ea -cp " + librairies()
+            java_cmd = "run_student java " + jvm_options() + " -cp " + librairies()
+            if failfast:
+                java_cmd += " -Drunner.failfast=true"
             # On passe comme argument au fichier runner les fichier de tests (Voir documentation runner)
             resproc = subprocess.Popen( shlex.split(java_cmd) + ['src/' + runner] + tests, universal_newlines=True, stderr=f, stdout=subprocess.PIPE)
             resproc.communicate()
@@ -165,6 +229,8 @@ def run(customscript,execcustom,nexercices,tests=[],runner='Runner'):
             f.seek(0)
             outerr = f.read()
             print(outerr) # On affiche la sortie de stderr dans les informations de debug
+            results, not_run = read_runner_results(RUNNER_RESULTS)
+            task_common.record_test_stats(stats_file, results)
             if resultat == 127: # Les tests ont réussis
                 feedback.set_global_result('success')
             elif resultat == 252: # Limite de mémoire dépassée
@@ -202,6 +268,8 @@ def run(customscript,execcustom,nexercices,tests=[],runner='Runner'):
                             feed = _("Il semble que vous ayez fait des erreurs dans votre code…\n\n") + code_litteral + outerr_question + "\n"
                             feedback.set_problem_feedback(feed,"q"+str(i))
                         i += 1
+            if not_run: # Mode fail-fast : les tests restants n'ont pas été lancés
+                feedback.set_global_feedback(_("Les tests suivants n'ont pas été lancés après le premier échec : ") + ", ".join(not_run) + "\n", True)
     else: # La compilation a raté
         Log = add_indentation_level(Log)
         feed = _("Le programme ne compile pas : \n\n") + code_litteral + Log + "\n"
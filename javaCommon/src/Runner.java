@@ -19,11 +19,19 @@ import org.junit.runner.JUnitCore;
 import org.junit.runner.Result;
 import org.junit.runner.notification.Failure;
 
+import java.io.FileWriter;
+import java.io.IOException;
+import java.io.PrintWriter;
+import java.io.StringWriter;
 import java.util.List;
 import java.util.ArrayList;
+import java.util.Locale;
 
 public class Runner {
 
+	// Outcome and duration of each test class, read by runfile.py to keep the history of the task
+	private static final String RESULTS_FILE = "runner_results.txt";
+
 	private static Class [] getClass(String [] args) {
 		Class [] c = new Class[args.length];
 		for(int i=0;i<args.length;i++){
@@ -38,12 +46,36 @@ public class Runner {
 	}
 
 	
+	/*
+	 * Runs the test classes in the given order. With -Drunner.failfast=true, the classes
+	 * following the first failed one are not run and are reported as NOT_RUN.
+	 */
 	public static void main(String[] args) {
-		Result result = JUnitCore.runClasses(getClass(args));
-		for (Failure failure: result.getFailures()) {
-			System.err.println(failure.getMessage());
+		boolean failFast = Boolean.getBoolean("runner.failfast");
+		Class [] classes = getClass(args);
+		boolean successful = true;
+		PrintWriter results;
+		try {
+			results = new PrintWriter(new FileWriter(RESULTS_FILE));
+		} catch (IOException e) { // The history is optional, the tests still run
+			results = new PrintWriter(new StringWriter());
+		}
+		for (int i=0;i<classes.length;i++) {
+			if (failFast && !successful) {
+				results.printf(Locale.ROOT, "%s#NOT_RUN#0%n", args[i]);
+				continue;
+			}
+			long start = System.nanoTime();
+			Result result = JUnitCore.runClasses(classes[i]);
+			double duration = (System.nanoTime() - start) / 1e9;
+			for (Failure failure: result.getFailures()) {
+				System.err.println(failure.getMessage());
+			}
+			successful = successful && result.wasSuccessful();
+			results.printf(Locale.ROOT, "%s#%s#%.6f%n", args[i], result.wasSuccessful() ? "SUCCESS" : "FAIL", duration);
 		}
-        if (result.wasSuccessful() ) {
+		results.close();
+		if (successful) {
 			System.exit(127);
 		}
 	}
@@ -0,0 +1,7 @@
+"""
+Local stand-in for the ``inginious`` package available in the grading containers.
+
+Only the modules used by the run scripts of the judges are provided (input, feedback, rst).
+The submission is read from the JSON file given by SUBMISSION_INPUT and the feedback is
+written to the JSON file given by SUBMISSION_FEEDBACK, see local/load_generator.py.
+"""
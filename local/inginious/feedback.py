@@ -0,0 +1,67 @@
+import json
+import os
+
+FEEDBACK_FILE = os.environ.get('SUBMISSION_FEEDBACK', '/.__output/__feedback.json')
+
+
+def load_feedback():
+    try:
+        with open(FEEDBACK_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_feedback(rdict):
+    os.makedirs(os.path.dirname(FEEDBACK_FILE), exist_ok=True)
+    with open(FEEDBACK_FILE, 'w', encoding='utf-8') as f:
+        json.dump(rdict, f)
+
+
+def set_global_result(result):
+    rdict = load_feedback()
+    rdict['result'] = result
+    save_feedback(rdict)
+
+
+def set_problem_result(result, problem_id):
+    rdict = load_feedback()
+    problems = rdict.setdefault('problems', {})
+    current = problems.get(problem_id, '')
+    problems[problem_id] = [result, current] if isinstance(current, str) else [result, current[1]]
+    save_feedback(rdict)
+
+
+def set_grade(grade):
+    rdict = load_feedback()
+    rdict['grade'] = grade
+    save_feedback(rdict)
+
+
+def set_global_feedback(feedback, append=False):
+    rdict = load_feedback()
+    rdict['text'] = rdict.get('text', '') + feedback if append else feedback
+    save_feedback(rdict)
+
+
+def set_problem_feedback(feedback, problem_id, append=False):
+    rdict = load_feedback()
+    problems = rdict.setdefault('problems', {})
+    current = problems.get(problem_id, '')
+    if isinstance(current, list):
+        current[1] = current[1] + feedback if append else feedback
+    else:
+        problems[problem_id] = current + feedback if append else feedback
+    save_feedback(rdict)
+
+
+def set_tag(tag, value):
+    rdict = load_feedback()
+    rdict.setdefault('tests', {})[tag] = value
+    save_feedback(rdict)
+
+
+def set_custom_value(custom_name, custom_val):
+    rdict = load_feedback()
+    rdict.setdefault('custom', {})[custom_name] = custom_val
+    save_feedback(rdict)
@@ -0,0 +1,29 @@
+import json
+import os
+import re
+
+INPUT_FILE = os.environ.get('SUBMISSION_INPUT', '/.__input/__inputdata.json')
+
+
+def load_input():
+    """Returns the submission data, the answers of the student being under the 'input' key"""
+    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def get_input(name):
+    return load_input()['input'][name]
+
+
+def parse_template(input_filename, output_filename=''):
+    """Replaces the @<prefix>@<problem id>@<postfix>@ placeholders of the template by the answers of the student"""
+    data = load_input()
+    with open(input_filename, 'r', encoding='utf-8') as f:
+        template = f.read()
+    for field, value in data['input'].items():
+        regex = re.compile("@([^@]*)@" + re.escape(field) + "@([^@]*)@")
+        for prefix, postfix in set(regex.findall(template)):
+            rep = "\n".join(prefix + line + postfix for line in str(value).splitlines())
+            template = template.replace(f"@{prefix}@{field}@{postfix}@", rep)
+    with open(output_filename or input_filename, 'w', encoding='utf-8') as f:
+        f.write(template)
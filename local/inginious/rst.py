@@ -0,0 +1,18 @@
+def get_codeblock(language, text):
+    rst = "\n\n.. code-block:: " + language + "\n\n"
+    for line in text.splitlines():
+        rst += "\t" + line + "\n"
+    return rst + "\n"
+
+
+def get_admonition(cssclass, title, text):
+    rst = ("\n\n.. admonition:: " + title + "\n") if title else "\n\n.. note:: \n"
+    rst += "\t:class: alert alert-" + cssclass + "\n\n"
+    for line in text.splitlines():
+        rst += "\t" + line + "\n"
+    return rst + "\n"
+
+
+def indent_block(amount, text, indent_char='\t'):
+    padding = amount * indent_char
+    return padding + ('\n' + padding).join(text.split('\n'))
@@ -0,0 +1,199 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic load generator for the judges.
+
+Replays submission files (``tests/data/tasks/<task>/test/*.test``, the YAML format of the
+INGInious submission archives) at a configurable rate and reports the throughput and the
+latency percentiles of the grading. Each submission is graded in a fresh copy of its task
+directory, by running the grading command (``python3 run`` by default) with:
+
+    - the current directory set to the copy of the task directory;
+    - SUBMISSION_INPUT pointing to a JSON file holding the submission, read by the local
+      ``inginious`` package, and SUBMISSION_FEEDBACK to the JSON file receiving the feedback;
+    - the local ``inginious`` package and the judges' common files first in PYTHONPATH;
+    - the local ``run_student`` stand-in first in PATH.
+
+A grading fails when the command exits with a non-zero code, when it does not set a global
+result, or when it cannot be started. Failed gradings are reported separately and are not
+counted in the throughput and latencies.
+
+Arrivals are open-loop: submission i is started at i / rate seconds, whether or not the
+previous ones are done, so the reported latency includes the time spent waiting for a
+free grader when the judges cannot keep up with the rate.
+
+Usage: load_generator.py [--rate R] [--count N] [--concurrency C] [submission files...]
+"""
+import argparse
+import glob
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import cycle, islice
+from pathlib import Path
+from typing import List, Optional
+
+import yaml
+
+LOCAL_DIR = Path(__file__).resolve().parent
+JUDGES_DIR = LOCAL_DIR.parent
+DEFAULT_SUBMISSIONS = str(LOCAL_DIR.parent / 'tests' / 'data' / 'tasks' / '*' / 'test' / '*.test')
+PERCENTILES = [50, 90, 95, 99]
+
+
+@dataclass
+class Submission:
+    path: Path
+    task_dir: Path #Task directory the submission belongs to (parent of the test/ folder)
+    input: dict
+
+
+@dataclass
+class Result:
+    submission: Submission
+    returncode: Optional[int]
+    latency: float #Seconds between the scheduled arrival and the end of the grading
+    service_time: float #Seconds spent grading
+    result: Optional[str] = None #Global result set by the grading ('success', 'failed', ...)
+    error: Optional[str] = None #Why the grading failed, None if it completed
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+
+def load_submission(path: Path) -> Submission:
+    with open(path, 'r') as f:
+        data = yaml.safe_load(f)
+    return Submission(path=path, task_dir=path.parent.parent, input=data.get('input', {}))
+
+
+def grade(submission: Submission, command: str, arrival: float, keep_output: bool) -> Result:
+    """
+    @brief: grades a submission in a temporary copy of its task directory
+
+    @param submission: (Submission) the submission to grade
+    @param command: (str) the grading command, run from the task directory copy
+    @param arrival: (float) time.monotonic() at which the submission was scheduled
+    @param keep_output: (bool) forward the output of the grading command instead of discarding it
+
+    @return Result: the outcome and timings of the grading
+    """
+    start = time.monotonic()
+    with tempfile.TemporaryDirectory(prefix='judge-load-') as workspace:
+        task_copy = os.path.join(workspace, 'task')
+        shutil.copytree(submission.task_dir, task_copy, ignore=shutil.ignore_patterns('test'))
+        input_file = os.path.join(workspace, 'input.json')
+        with open(input_file, 'w') as f:
+            json.dump({'input': submission.input}, f)
+        feedback_file = os.path.join(workspace, 'feedback.json')
+
+        env = dict(os.environ)
+        env['SUBMISSION_INPUT'] = input_file
+        env['SUBMISSION_FEEDBACK'] = feedback_file
+        env['PATH'] = f"{LOCAL_DIR}{os.pathsep}{env.get('PATH', '')}"
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(LOCAL_DIR), str(JUDGES_DIR), env.get('PYTHONPATH')]))
+        env['JUDGE_COMMON'] = str(JUDGES_DIR)
+        output = None if keep_output else subprocess.PIPE
+        try:
+            p = subprocess.run(shlex.split(command), cwd=task_copy, env=env, stdout=output, stderr=subprocess.STDOUT if output else None)
+        except OSError as e:
+            end = time.monotonic()
+            return Result(submission=submission, returncode=None, latency=end - arrival, service_time=end - start,
+                          error=f"cannot start {command}: {e}")
+        try:
+            with open(feedback_file, 'r') as f:
+                result = json.load(f).get('result')
+        except (OSError, ValueError):
+            result = None
+    end = time.monotonic()
+
+    error = None
+    if p.returncode or result is None:
+        tail = p.stdout.decode('utf-8', 'replace').strip().splitlines()[-1:] if p.stdout else []
+        reason = f"exit code {p.returncode}" if p.returncode else "no global result in the feedback"
+        error = ": ".join([reason] + tail)
+    return Result(submission=submission, returncode=p.returncode, latency=end - arrival, service_time=end - start,
+                  result=result, error=error)
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of values, which must be sorted"""
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+def run_load(submissions: List[Submission], command: str, rate: float, count: int, concurrency: int, keep_output: bool) -> List[Result]:
+    jobs = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        origin = time.monotonic()
+        for i, submission in enumerate(islice(cycle(submissions), count)):
+            arrival = origin + i / rate
+            delay = arrival - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            jobs.append((submission, arrival, executor.submit(grade, submission, command, arrival, keep_output)))
+
+    results = []
+    for submission, arrival, future in jobs:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(Result(submission=submission, returncode=None, latency=time.monotonic() - arrival,
+                                  service_time=0.0, error=f"{type(e).__name__}: {e}"))
+    return results
+
+
+def report(results: List[Result], elapsed: float, out=sys.stdout):
+    graded = [r for r in results if not r.failed]
+    failed = [r for r in results if r.failed]
+    latencies = sorted(r.latency for r in graded)
+    service_times = sorted(r.service_time for r in graded)
+    print(f"submissions: {len(results)} in {elapsed:.2f}s, {len(graded)} graded, {len(failed)} failed", file=out)
+    print(f"throughput:  {len(graded) / elapsed if elapsed > 0 else 0.0:.2f} submissions/s", file=out)
+    for name, values in (("latency", latencies), ("service", service_times)):
+        stats = "  ".join(f"p{p}={percentile(values, p):.3f}s" for p in PERCENTILES)
+        print(f"{name + ':':<12} {stats}  max={values[-1] if values else 0.0:.3f}s", file=out)
+    verdicts = Counter(r.result for r in graded)
+    print("results:     " + ", ".join(f"{verdict}: {n}" for verdict, n in sorted(verdicts.items())), file=out)
+    errors = Counter(f"{r.submission.path}: {r.error}" for r in failed)
+    for error, n in errors.most_common():
+        print(f"FAILED ({n}x) {error}", file=out)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Replays submissions against the judges and reports throughput and latency")
+    parser.add_argument("submissions", nargs='*', help=f"submission files (default: {DEFAULT_SUBMISSIONS})")
+    parser.add_argument("--rate", type=float, default=1.0, help="submissions started per second")
+    parser.add_argument("--count", type=int, default=None, help="number of submissions to replay, cycling over the files (default: one each)")
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count(), help="number of submissions graded in parallel")
+    parser.add_argument("--command", default=f"{sys.executable} run", help="grading command, run from the task directory")
+    parser.add_argument("--verbose", action="store_true", help="show the output of the grading command")
+    args = parser.parse_args(argv)
+    if args.rate <= 0:
+        parser.error("--rate must be positive")
+
+    paths = args.submissions or sorted(glob.glob(DEFAULT_SUBMISSIONS))
+    if not paths:
+        parser.error("no submission file found")
+    submissions = [load_submission(Path(p)) for p in paths]
+    count = args.count if args.count is not None else len(submissions)
+
+    start = time.monotonic()
+    results = run_load(submissions, args.command, args.rate, count, args.concurrency, args.verbose)
+    report(results, time.monotonic() - start)
+    return 1 if any(r.failed for r in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
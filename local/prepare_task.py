@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Prepares a task before it is deployed to a course.
+
+Runs the reference solution of the task (the first file of ``solutions/`` by default) through its
+tests and writes the per-test time budgets to ``student/time_budgets.txt``, read by CTester and by
+the run script of the task (see task_common.prepare_time_budgets). The reference durations are
+cached in the manifest of the task, so the solution only runs again when a source file of the
+task changes.
+
+Run it whenever a task is created or modified, where its tests can be built (the grading image
+of the task, with CUnit), and deploy the budgets file with the task.
+
+Usage: prepare_task.py [--reference FILE] [--build COMMAND] [--run COMMAND] task directories...
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from task_common import task_dir_to_TaskData, prepare_time_budgets
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Calibrates the time budgets of tasks on their reference solution")
+    parser.add_argument("tasks", nargs='+', help="task directories")
+    parser.add_argument("--reference", default=None, help="reference solution (default: first file of solutions/ with the extension of the student code)")
+    parser.add_argument("--build", default="make", help="command building the tests, run from the student directory")
+    parser.add_argument("--run", default="./tests", help="command running the tests, run from the student directory")
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for task_dir in args.tasks:
+        task = task_dir_to_TaskData(Path(task_dir))
+        reference = Path(args.reference) if args.reference else None
+        path = prepare_time_budgets(task, reference, args.build, args.run)
+        if path is None:
+            print(f"{task_dir}: calibration failed", file=sys.stderr)
+            failed += 1
+        else:
+            print(f"{task_dir}: {path}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
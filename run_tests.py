@@ -1,11 +1,55 @@
 import unittest
 from tests.test_task_data import TaskDataTestCase
+from tests.test_feedback_buffer import FeedbackBufferTestCase
+from tests.test_time_budgets import TimeBudgetsTestCase
+from tests.test_template import TemplateTestCase
+from tests.test_history import HistoryTestCase
+from tests.test_metrics import GradingMetricsTestCase
+from tests.test_resources import ResourcesTestCase
+from tests.test_local_tools import RunStudentTestCase, LoadGeneratorTestCase
 
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(TaskDataTestCase('test_task_dir_to_TaskData'))
     suite.addTest(TaskDataTestCase('test_student_code_generate'))
     suite.addTest(TaskDataTestCase('test_student_code_validate'))
+    suite.addTest(TaskDataTestCase('test_build_framework'))
+    suite.addTest(FeedbackBufferTestCase('test_flush_once'))
+    suite.addTest(FeedbackBufferTestCase('test_existing_feedback'))
+    suite.addTest(FeedbackBufferTestCase('test_missing_directory'))
+    suite.addTest(FeedbackBufferTestCase('test_sigterm'))
+    suite.addTest(FeedbackBufferTestCase('test_sigterm_ignored'))
+    suite.addTest(TimeBudgetsTestCase('test_derive_time_budgets'))
+    suite.addTest(TimeBudgetsTestCase('test_fast_tests_budgets'))
+    suite.addTest(TimeBudgetsTestCase('test_calibrate_time_budgets'))
+    suite.addTest(TimeBudgetsTestCase('test_calibrate_failure'))
+    suite.addTest(TimeBudgetsTestCase('test_write_time_budgets'))
+    suite.addTest(TimeBudgetsTestCase('test_task_version'))
+    suite.addTest(TimeBudgetsTestCase('test_prepare_time_budgets'))
+    suite.addTest(TemplateTestCase('test_template_compile'))
+    suite.addTest(TemplateTestCase('test_compiled_template_cached'))
+    suite.addTest(TemplateTestCase('test_template_generator'))
+    suite.addTest(HistoryTestCase('test_parse_test_results'))
+    suite.addTest(HistoryTestCase('test_record_test_stats'))
+    suite.addTest(HistoryTestCase('test_missing_state_directory'))
+    suite.addTest(HistoryTestCase('test_task_stats_path'))
+    suite.addTest(HistoryTestCase('test_order_tests'))
+    suite.addTest(HistoryTestCase('test_write_test_order'))
+    suite.addTest(GradingMetricsTestCase('test_flush_accumulates'))
+    suite.addTest(GradingMetricsTestCase('test_feedback_buffer_outcomes'))
+    suite.addTest(GradingMetricsTestCase('test_missing_directory'))
+    suite.addTest(ResourcesTestCase('test_stage_resources'))
+    suite.addTest(ResourcesTestCase('test_two_arguments_feedback'))
+    suite.addTest(ResourcesTestCase('test_optional_arguments_feedback'))
+    suite.addTest(ResourcesTestCase('test_write_resource_summary'))
+    suite.addTest(RunStudentTestCase('test_exit_code'))
+    suite.addTest(RunStudentTestCase('test_memory'))
+    suite.addTest(RunStudentTestCase('test_hard_time'))
+    suite.addTest(RunStudentTestCase('test_signal'))
+    suite.addTest(LoadGeneratorTestCase('test_percentile'))
+    suite.addTest(LoadGeneratorTestCase('test_load_submission'))
+    suite.addTest(LoadGeneratorTestCase('test_grade'))
+    suite.addTest(LoadGeneratorTestCase('test_grade_failure'))
     return suite
 
 if __name__ == '__main__':
@@ -3,8 +3,10 @@ from pathlib import Path
 import yaml
 import os
 import logging
-import subprocess, shlex, re, os, yaml
-from dataclasses import dataclass
+import subprocess, shlex, re, os, sys, yaml
+import atexit, fcntl, hashlib, json, math, shutil, signal, tempfile, time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
 from itertools import chain
 logging.basicConfig()
 logger = logging.getLogger('JudgeAPI')
@@ -41,6 +43,7 @@ class TaskData:
     lib_dirs: Optional[List[Path]] #Used to store the paths of the libraries and includes used by the task
     annex: Optional[List[Path]] #Used to store a list of paths with annex files
     student_code: Optional[Path] #Path to the student code
+    resources: List['StageResources'] = field(default_factory=list) #Resources consumed by each stage run so far
 
     
 
@@ -158,11 +161,73 @@ def task_dir_to_TaskData(task_dir_path: Path, build_script: Path=None, lib_dirs:
     return TaskData(**TaskData_init_kwargs)
 
 
+MANIFEST_NAME = '.task_manifest.json' #Per-task cache of the data computed once per task version
+# Node-local directory keeping data across the gradings, which run in fresh copies of the task directory.
+# It must be mounted in the grading containers, nothing is kept across gradings if it does not exist.
+STATE_DIR = os.environ.get('JUDGE_STATE_DIR', '/var/lib/inginious-judges')
+
+def task_version(task: TaskData) -> str:
+    """
+    @brief: computes a version identifier of the task from the content of its source files
+
+    Only the source files are part of the version: not the test submissions, nor the files written
+    by this API or by the gradings (manifest, budgets, order and test metadata files, test results,
+    generated student code), nor hidden files, so that calibrating or grading a task keeps its version.
+
+    @param task: (TaskData) the task to identify
+
+    @return str: a hexadecimal digest changing whenever a source file of the task changes
+    """
+    excluded = {_student_code_name(task), TIME_BUDGETS_NAME, TEST_ORDER_NAME, TEST_METADATA_NAME, RESOURCES_NAME, 'results.txt', 'timings.txt'}
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(task.task_root):
+        dirs[:] = sorted(d for d in dirs if not (root == str(task.task_root) and d == 'test') and d != '__pycache__')
+        for fname in sorted(files):
+            if fname in excluded or fname.startswith('.'):
+                continue
+            fpath = os.path.join(root, fname)
+            digest.update(os.path.relpath(fpath, task.task_root).encode('utf-8'))
+            with open(fpath, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+def task_manifest_load(task: TaskData, manifest_path: Path=None) -> dict:
+    """
+    @brief: loads the manifest of the task, dropping its content if it was computed for another version of the task
+
+    @param task: (TaskData) the task owning the manifest
+    @param manifest_path: (Path) location of the manifest, defaults to MANIFEST_NAME in the task directory
+
+    @return dict: the manifest, always containing the 'version' key
+    """
+    manifest_path = manifest_path or Path(os.path.join(task.task_root, MANIFEST_NAME))
+    version = task_version(task)
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    if manifest.get('version') != version:
+        logger.debug(f"Task manifest {manifest_path} is missing or outdated")
+        manifest = {'version': version}
+    return manifest
+
+def task_manifest_save(task: TaskData, manifest: dict, manifest_path: Path=None):
+    manifest_path = manifest_path or Path(os.path.join(task.task_root, MANIFEST_NAME))
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(manifest_path), prefix=f".{os.path.basename(manifest_path)}.")
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def _student_code_name(task: TaskData) -> str:
+    filename_components = task.template.name.split(".")
+    extension = filename_components[1] if len(filename_components) > 2 else ""
+    return f"{filename_components[0]}.{extension}"
+
 def student_code_generate(task: TaskData, generator: Callable[[str, str], None]):
     filename = task.template.name
-    filename_components = filename.split(".")
-    extension = filename_components[1] if len(filename_components) > 2 else ""
-    output_name = f"{filename_components[0]}.{extension}"
+    output_name = _student_code_name(task)
     in_path = os.path.join(task.task_root, 'student', filename)
     out_path = os.path.join(task.task_root, 'student', output_name)
     generator(in_path, out_path)
@@ -170,6 +235,113 @@ def student_code_generate(task: TaskData, generator: Callable[[str, str], None])
     logger.debug(f"Generated student code: {output_name}")
 
 
+# Placeholder of the INGInious templates: @<prefix>@<problem id>@<postfix>@, each line of the
+# answer to the problem is rendered between prefix and postfix (both are usually empty)
+TEMPLATE_PLACEHOLDER = re.compile(r"@([^@]*)@([\w-]+)@([^@]*)@")
+
+def template_compile(template_path: Path, problems: List[str]=None) -> list:
+    """
+    @brief: parses a template into literal and placeholder segments
+
+    @param template_path: (Path) the template file
+    @param problems: (List[str]) the problem ids of the task, restricts the placeholders to these ids when given
+
+    @return list: the segments, literal strings and [prefix, problem id, postfix] lists, serializable in JSON
+    """
+    with open(template_path, 'r', encoding='utf-8') as f:
+        return _template_segments(f.read(), problems)
+
+def _template_segments(template: str, problems: List[str]=None) -> list:
+    placeholder = TEMPLATE_PLACEHOLDER
+    if problems:
+        placeholder = re.compile("@([^@]*)@(" + "|".join(re.escape(p) for p in problems) + ")@([^@]*)@")
+    segments = []
+    position = 0
+    for match in placeholder.finditer(template):
+        if match.start() > position:
+            segments.append(template[position:match.start()])
+        segments.append(list(match.groups()))
+        position = match.end()
+    if position < len(template):
+        segments.append(template[position:])
+    return segments
+
+def template_render(segments: list, inputs: dict) -> str:
+    """
+    @brief: renders compiled segments with the answers of the student, like inginious.input.parse_template
+
+    Placeholders of problems without answer are left untouched.
+
+    @param segments: (list) the segments returned by template_compile
+    @param inputs: (dict) the answers of the student, by problem id
+    """
+    parts = []
+    for segment in segments:
+        if isinstance(segment, str):
+            parts.append(segment)
+            continue
+        prefix, problem, postfix = segment
+        if problem in inputs:
+            parts.append("\n".join(prefix + line + postfix for line in str(inputs[problem]).splitlines()))
+        else:
+            parts.append(f"@{prefix}@{problem}@{postfix}@")
+    return "".join(parts)
+
+def compiled_template(template_path: Path, problems: List[str]=None, cache_dir: Path=None) -> list:
+    """
+    @brief: returns the segments of a template, compiled once per template content and problem ids
+
+    The segments are cached in cache_dir (the templates directory of STATE_DIR by default), under the digest
+    of the template content and of the problem ids, so that the cache is shared by the copies of the task
+    directory made for each grading. The template is compiled without cache if STATE_DIR does not exist.
+
+    @param template_path: (Path) the template file
+    @param problems: (List[str]) the problem ids of the task, see template_compile
+    @param cache_dir: (Path) the cache directory
+
+    @return list: the segments, as returned by template_compile
+    """
+    cache_dir = cache_dir or os.path.join(STATE_DIR, 'templates')
+    with open(template_path, 'rb') as f:
+        template = f.read()
+    key = hashlib.sha256(template + json.dumps(problems or []).encode('utf-8')).hexdigest()
+    cache_path = os.path.join(cache_dir, f"{key}.json")
+    try:
+        with open(cache_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+    segments = _template_segments(template.decode('utf-8'), problems)
+    if os.path.isdir(os.path.dirname(os.path.abspath(cache_dir))):
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.tmp-')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(segments, f)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Could not cache the compiled template {template_path}: {e}")
+    return segments
+
+def template_generator(task: TaskData, inputs: dict, cache_dir: Path=None) -> Callable[[str, str], None]:
+    """
+    @brief: builds a generator for student_code_generate rendering the cached compiled template instead of parsing the file
+
+    @param task: (TaskData) the task the student code is generated for
+    @param inputs: (dict) the answers of the student, by problem id
+    @param cache_dir: (Path) the cache directory of the compiled templates, see compiled_template
+
+    @return Callable: the generator, taking the template path and the output path
+    """
+    problems = list((task.task or {}).get('problems', {}))
+
+    def generator(in_path: str, out_path: str):
+        segments = compiled_template(Path(in_path), problems, cache_dir)
+        with open(out_path, 'w', encoding='utf-8') as f:
+            f.write(template_render(segments, inputs))
+    return generator
+
+
 
 def student_code_validate(task: TaskData) -> bool:
     if task.student_code is None:
@@ -181,56 +353,96 @@ def student_code_validate(task: TaskData) -> bool:
     return True
 
 
-def _command_and_feedback(task: TaskData, command: str, check_and_feedback: Callable[[int, str], bool]):
+@dataclass
+class StageResources:
+    stage: str
+    wall_time: float #Seconds
+    user_time: float #Seconds of cpu time in user mode, including the children reaped by the command
+    system_time: float #Seconds of cpu time in kernel mode, including the children reaped by the command
+    max_rss: int #Peak resident set size, in bytes
+    block_input: int #Number of block input operations
+    block_output: int #Number of block output operations
+
+
+def _run_with_resources(args: List[str], stage: str) -> (int, str, StageResources):
+    """
+    @brief: runs a command, reaping it with os.wait4 to get the resources it consumed
+
+    @return (int, str, StageResources): the return code, the output (stdout and stderr) and the resources of the command
+    """
+    start = time.monotonic()
+    p = subprocess.Popen(args, stderr=subprocess.STDOUT, stdout=subprocess.PIPE)
+    with p.stdout:
+        output = p.stdout.read().decode('utf-8')
+    _, status, usage = os.wait4(p.pid, 0)
+    p.returncode = os.waitstatus_to_exitcode(status)
+    resources = StageResources(stage=stage, wall_time=time.monotonic() - start, user_time=usage.ru_utime,
+                               system_time=usage.ru_stime, max_rss=usage.ru_maxrss * 1024,
+                               block_input=usage.ru_inblock, block_output=usage.ru_oublock)
+    return p.returncode, output, resources
+
+
+def _command_and_feedback(task: TaskData, command: str, check_and_feedback: Callable[[int, str], bool],
+                          metrics: 'GradingMetrics'=None, stage: str='command', with_resources: bool=False):
     """
     Wrapper around launching a command and setting feedback
     command: any command to be run using Popen
     check_and_feedback: a callable taking the status code of the process 
                         to be called by command and the output of said command, it does the feedback accordingly.
+    metrics: optional GradingMetrics recording the duration of the command under the name stage
+    with_resources: if True, check_and_feedback also receives the StageResources of the command as keyword argument resources
+    The resources consumed by the command are appended to task.resources, see write_resource_summary.
     """
     if(len(command) >= 0):
-        p = subprocess.Popen(shlex.split(command.format(task.student_code)), stderr=subprocess.STDOUT, stdout=subprocess.PIPE)
-        output = p.communicate()[0].decode('utf-8')
-        return check_and_feedback(p.returncode, output)
+        returncode, output, resources = _run_with_resources(shlex.split(command.format(task.student_code)), stage)
+        task.resources.append(resources)
+        if metrics is not None:
+            metrics.observe(stage, resources.wall_time)
+        if with_resources:
+            return check_and_feedback(returncode, output, resources=resources)
+        return check_and_feedback(returncode, output)
     return True
 
-def student_code_pre_compile(task: TaskData, command: str, check_and_feedback: Callable[[int, str], None]):
+def student_code_pre_compile(task: TaskData, command: str, check_and_feedback: Callable[[int, str], None], metrics: 'GradingMetrics'=None,
+                             with_resources: bool=False):
     """
     The commands to be called before we even try to compile the student code
     task: structure containing the data related to the task we're testing
     command: a string containing the command necessary for the pre compilation step
     check_and_feedback: a callable taking the status code of the process 
                         to be called by command and the output of said command, it does the feedback accordingly.
-    
+    metrics: optional GradingMetrics recording the duration of the stage
+    with_resources: if True, check_and_feedback also receives the StageResources of the stage as keyword argument resources
     """
-    return _command_and_feedback(task, command, check_and_feedback)
+    return _command_and_feedback(task, command, check_and_feedback, metrics, 'pre_compile', with_resources)
 
 
-def student_code_compile(task: TaskData, command: str, check_and_feedback: Callable[[int, str, Optional[Path], Optional[List[Path]]], None]):
+def student_code_compile(task: TaskData, command: str, check_and_feedback: Callable[[int, str, Optional[Path], Optional[List[Path]]], None], metrics: 'GradingMetrics'=None,
+                             with_resources: bool=False):
     """
     Performs the compilation of the student code and performs the test related to it
     task: structure containing the data related to the task we're testing
     command: a string containing the command necessary for the compilation step
     check_and_feedback: a callable taking the status code of the process 
                         to be called by command and the output of said command, it does the feedback accordingly.
+    metrics: optional GradingMetrics recording the duration of the stage
+    with_resources: if True, check_and_feedback also receives the StageResources of the stage as keyword argument resources
     """
-    if(len(command) >= 0):
-        p = subprocess.Popen(shlex.split(command.format(task.student_code)), stderr=subprocess.STDOUT, stdout=subprocess.PIPE)
-        output = p.communicate()[0].decode('utf-8')
-        return check_and_feedback(p.returncode, output)
-    return True
+    return _command_and_feedback(task, command, check_and_feedback, metrics, 'compile', with_resources)
 
 
-def student_code_post_compile(task: TaskData, command: str, check_and_feedback: Callable[[int, str], None]):
+def student_code_post_compile(task: TaskData, command: str, check_and_feedback: Callable[[int, str], None], metrics: 'GradingMetrics'=None,
+                             with_resources: bool=False):
     """
     The commands to be called after we know the compilation went well
     task: structure containing the data related to the task we're testing
     command: a string containing the command necessary for the extra compilation steps
     check_and_feedback: a callable taking the status code of the process 
                         to be called by command and the output of said command, it does the feedback accordingly.
-    
+    metrics: optional GradingMetrics recording the duration of the stage
+    with_resources: if True, check_and_feedback also receives the StageResources of the stage as keyword argument resources
     """
-    return _command_and_feedback(task, command, check_and_feedback)
+    return _command_and_feedback(task, command, check_and_feedback, metrics, 'post_compile', with_resources)
 
 def student_code_test_execution(task: TaskData, test: Callable[[Any], None]):
     """
@@ -240,13 +452,588 @@ def student_code_test_execution(task: TaskData, test: Callable[[Any], None]):
     """
     pass
 
-def student_code_test_external(task: TaskData, command: str, check_and_feedback: Callable[[int, str], None]):
+def student_code_test_external(task: TaskData, command: str, check_and_feedback: Callable[[int, str], None], metrics: 'GradingMetrics'=None,
+                             with_resources: bool=False):
     """
     Any supplementary test in pure python to run from the outside of the student code
     task: structure containing the data related to the task we're testing
     test: the function that will perform the tests and optionally give a feedback
+    metrics: optional GradingMetrics recording the duration of the stage
+    with_resources: if True, check_and_feedback also receives the StageResources of the stage as keyword argument resources
+    """
+    return _command_and_feedback(task, command, check_and_feedback, metrics, 'test_external', with_resources)
+
+
+RESOURCES_NAME = 'resources.json' #Per-submission summary of the resources consumed by each stage
+
+def write_resource_summary(task: TaskData, path: Path=None) -> Path:
+    """
+    @brief: writes the resources consumed by the stages of the submission, to size limits.memory and limits.time of the tasks
+
+    @param task: (TaskData) the task whose stages were run
+    @param path: (Path) the summary file, defaults to RESOURCES_NAME in the student directory
+
+    @return Path: the path of the written file
     """
-    return _command_and_feedback(task, command, check_and_feedback)
+    path = path or Path(os.path.join(task.task_root, 'student', RESOURCES_NAME))
+    summary = {
+        'stages': [asdict(r) for r in task.resources],
+        'total': {
+            'wall_time': sum(r.wall_time for r in task.resources),
+            'user_time': sum(r.user_time for r in task.resources),
+            'system_time': sum(r.system_time for r in task.resources),
+            'max_rss': max((r.max_rss for r in task.resources), default=0),
+            'block_input': sum(r.block_input for r in task.resources),
+            'block_output': sum(r.block_output for r in task.resources),
+        }
+    }
+    with open(path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    return path
+
+
+TIME_BUDGETS_NAME = 'time_budgets.txt' #Budgets file passed to CTester with TIME_BUDGETS=<file>
+TIME_BUDGET_FACTOR = 5.0 #Budget of a test, as a multiple of the reference time
+TIME_BUDGET_FLOOR = 0.5 #Minimal budget of a test, in seconds, absorbs the noise on very fast tests. Per task: time_budget_floor in task.yaml
+RUN_BUDGET_FLOOR = 5.0 #Added to the budget of the whole run, in seconds, covers the process and CUnit setup
+RUN_BUDGET_MAX = 20 #Maximal cpu time budget of the whole run, in seconds, the fixed limit of the run scripts
+HARD_TIME_FACTOR = 2 #Wall-clock limit of the run, as a multiple of its cpu time budget
+HARD_TIME_MAX = 60 #Maximal wall-clock limit of the run, in seconds, the fixed limit of the run scripts
+
+def calibrate_time_budgets(task: TaskData, reference: Path=None, build_command: str="make", run_command: str="./tests",
+                           manifest_path: Path=None, timeout: int=600) -> Optional[dict]:
+    """
+    @brief: measures the duration of each test on the reference solution, once per task version
+
+    The reference solution (by default the first file of solutions/ with the extension of the student code)
+    replaces the student code in a copy of the task, which is then built and run. The per-test durations,
+    written by CTester in timings.txt, are stored in the task manifest and reused as long as the task does not change.
+    The metadata of the tests (problem id, description, weight), read from results.txt, are stored along, see
+    parse_test_metadata.
+
+    @param task: (TaskData) the task to calibrate
+    @param reference: (Path) the reference solution
+    @param build_command: (str) the command building the tests, run from the student directory
+    @param run_command: (str) the command running the tests, run from the student directory
+    @param manifest_path: (Path) location of the task manifest
+    @param timeout: (int) maximal duration of each command, in seconds
+
+    @return dict: the reference duration of each test in seconds, None if the calibration failed
+    """
+    manifest = task_manifest_load(task, manifest_path)
+    if 'timings' in manifest and 'tests' in manifest:
+        return manifest['timings']
+
+    student_code_name = _student_code_name(task)
+    if reference is None:
+        solutions_dir = os.path.join(task.task_root, 'solutions')
+        extension = os.path.splitext(student_code_name)[1]
+        candidates = sorted(f for f in os.listdir(solutions_dir) if f.endswith(extension)) if os.path.isdir(solutions_dir) else []
+        if not candidates:
+            logger.error(f"No reference solution found in {solutions_dir}")
+            return None
+        reference = Path(os.path.join(solutions_dir, candidates[0]))
+
+    with tempfile.TemporaryDirectory(prefix='calibration-') as workspace:
+        task_copy = os.path.join(workspace, 'task')
+        shutil.copytree(task.task_root, task_copy, ignore=shutil.ignore_patterns('test', MANIFEST_NAME))
+        student_dir = os.path.join(task_copy, 'student')
+        shutil.copyfile(reference, os.path.join(student_dir, student_code_name))
+        for command in (build_command, run_command):
+            try:
+                p = subprocess.run(shlex.split(command), cwd=student_dir, stderr=subprocess.STDOUT, stdout=subprocess.PIPE, timeout=timeout)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                logger.error(f"Calibration command {command} failed: {e}")
+                return None
+            if p.returncode:
+                logger.error(f"Calibration command {command} failed with the reference solution {reference}:\n{p.stdout.decode('utf-8', 'replace')}")
+                return None
+        timings_path = os.path.join(student_dir, 'timings.txt')
+        results_path = os.path.join(student_dir, 'results.txt')
+        if not os.path.isfile(timings_path) or not os.path.isfile(results_path):
+            logger.error(f"The tests did not write {timings_path} and {results_path}, is CTester up to date ?")
+            return None
+        timings = {}
+        with open(timings_path, 'r') as f:
+            for line in f:
+                test, sep, seconds = line.strip().rpartition('#')
+                if sep:
+                    timings[test] = float(seconds)
+        tests = parse_test_metadata(Path(results_path), Path(timings_path))
+
+    manifest['timings'] = timings
+    manifest['tests'] = tests
+    task_manifest_save(task, manifest, manifest_path)
+    logger.debug(f"Calibrated {len(timings)} tests on {reference}")
+    return timings
+
+def derive_time_budgets(timings: dict, factor: float=TIME_BUDGET_FACTOR, floor: float=TIME_BUDGET_FLOOR,
+                        run_floor: float=RUN_BUDGET_FLOOR) -> (dict, float):
+    """
+    @brief: derives the time budgets from the reference durations
+
+    Each test gets factor x its reference time, at least floor. The whole run gets factor x the total
+    reference time plus run_floor, at most RUN_BUDGET_MAX: the floor of the tests is not summed, so
+    calibrated limits are never looser than the fixed ones they replace.
+
+    @param timings: (dict) reference duration of each test in seconds, as returned by calibrate_time_budgets
+
+    @return (dict, float): the budget of each test and the budget of the whole run, in seconds
+    """
+    per_test = {test: max(factor * seconds, floor) for test, seconds in timings.items()}
+    return per_test, min(factor * sum(timings.values()) + run_floor, RUN_BUDGET_MAX)
+
+def write_time_budgets(task: TaskData, per_test: dict, run_budget: float) -> Path:
+    """
+    @brief: writes the budgets file read by CTester (TIME_BUDGETS=<file>) and by the run script in the student directory
+
+    Tests are listed as <test name>#<milliseconds>. The cpu and wall-clock limits of run_student are
+    stored in the same file under the @time and @hard-time names, which cannot clash with a C function name.
+
+    @return Path: the path of the written file
+    """
+    path = Path(os.path.join(task.task_root, 'student', TIME_BUDGETS_NAME))
+    run_seconds = math.ceil(run_budget)
+    with open(path, 'w') as f:
+        for test, seconds in sorted(per_test.items()):
+            f.write(f"{test}#{math.ceil(seconds * 1000)}\n")
+        f.write(f"@time#{run_seconds * 1000}\n")
+        f.write(f"@hard-time#{min(HARD_TIME_FACTOR * run_seconds, HARD_TIME_MAX) * 1000}\n")
+    return path
+
+def prepare_time_budgets(task: TaskData, reference: Path=None, build_command: str="make", run_command: str="./tests",
+                         manifest_path: Path=None) -> Optional[Path]:
+    """
+    @brief: calibrates the task if its version changed and writes its budgets and test metadata files, to be run when the task is built
+
+    The floor of the per-test budgets is the time_budget_floor option of task.yaml, in seconds,
+    TIME_BUDGET_FLOOR by default. See calibrate_time_budgets for the other parameters.
+
+    @return Path: the path of the budgets file, None if the calibration failed
+    """
+    timings = calibrate_time_budgets(task, reference, build_command, run_command, manifest_path)
+    if timings is None:
+        return None
+    floor = float((task.task or {}).get('time_budget_floor', TIME_BUDGET_FLOOR))
+    per_test, run_budget = derive_time_budgets(timings, floor=floor)
+    write_test_metadata(task, task_manifest_load(task, manifest_path)['tests'])
+    return write_time_budgets(task, per_test, run_budget)
+
+
+STATS_NAME = 'test_stats.json' #Per-task history of the test outcomes, kept across task versions in STATE_DIR
+TEST_ORDER_NAME = 'test_order.txt' #Order file passed to CTester with TEST_ORDER=<file>
+TEST_METADATA_NAME = 'test_metadata.json' #Metadata of the tests, for the tests CTester reports as NOT_RUN
+DURATION_SMOOTHING = 0.2 #Weight of the last run in the moving average of the test durations
+
+def task_id(task_config: dict) -> str:
+    """
+    @brief: identifies a task across its versions and the copies of its directory made for the gradings
+
+    The id keys the test history and the metrics of the task, so it must be unique on the node: two tasks
+    with the same id share their history. Set judge_task_id in task.yaml (e.g. <course>/<task>), or the
+    JUDGE_TASK_ID environment variable. The display name of the task is only a fallback, shared by the
+    copies of a task across courses or sessions and lost when the task is renamed.
+
+    @param task_config: (dict) the parsed task.yaml of the task
+
+    @return str: JUDGE_TASK_ID if set, the judge_task_id option of task.yaml, or the name of the task in task.yaml otherwise
+    """
+    task_config = task_config or {}
+    explicit = os.environ.get('JUDGE_TASK_ID') or str(task_config.get('judge_task_id', '')).strip()
+    if explicit:
+        return explicit
+    name = str(task_config.get('name', '')).strip()
+    logger.warning(f"No judge_task_id in task.yaml nor JUDGE_TASK_ID, the task is identified by its name {name!r}")
+    return name
+
+def task_stats_path(task_config: dict) -> Path:
+    """
+    @brief: location of the history of the tests of a task, in its directory of STATE_DIR
+
+    @param task_config: (dict) the parsed task.yaml of the task, see task_id
+    """
+    task_dir = re.sub(r'[^\w.-]+', '_', task_id(task_config)).strip('_.') or '_'
+    return Path(os.path.join(STATE_DIR, 'tasks', task_dir, STATS_NAME))
+
+def load_test_stats(stats_path: Path) -> dict:
+    """
+    @brief: loads the history of the tests of a task, see task_stats_path
+
+    @return dict: for each test name, the number of 'runs', the number of 'failures' and the average 'duration' in seconds
+    """
+    try:
+        with open(stats_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def parse_test_results(results_path: Path, timings_path: Path) -> dict:
+    """
+    @brief: reads the outcome of each test from the results.txt and timings.txt files written by CTester
+
+    Both files list the tests that ran in the same order, tests reported as NOT_RUN are skipped.
+
+    @return dict: for each test name, a (passed, duration in seconds) tuple
+    """
+    with open(results_path, 'r') as f:
+        codes = [line.split('#')[1] for line in f.read().splitlines() if line]
+    with open(timings_path, 'r') as f:
+        timings = [line.strip().rpartition('#') for line in f if '#' in line]
+    codes = [code for code in codes if code != 'NOT_RUN']
+    return {test: (code == 'SUCCESS', float(seconds)) for code, (test, _, seconds) in zip(codes, timings)}
+
+def parse_test_metadata(results_path: Path, timings_path: Path) -> dict:
+    """
+    @brief: reads the metadata of each test from the results.txt and timings.txt files of a run of all the tests
+
+    CTester only knows the problem id, the description and the weight of a test once the test ran
+    (set_test_metadata is called in its body): the tests it skips in fail-fast mode are reported as
+    #NOT_RUN#<test name>#0#, and the run script takes their metadata from this calibration run instead.
+
+    @return dict: for each test name, its 'pid', 'desc' and 'weight', with the names of the run script
+    """
+    with open(results_path, 'r') as f:
+        results = [line.split('#') for line in f.read().splitlines() if line]
+    with open(timings_path, 'r') as f:
+        names = [line.strip().rpartition('#')[0] for line in f if '#' in line]
+    results = [r for r in results if r[1] != 'NOT_RUN']
+    return {name: {'pid': r[0], 'desc': r[2], 'weight': int(r[3])} for name, r in zip(names, results)}
+
+def write_test_metadata(task: TaskData, metadata: dict) -> Path:
+    """
+    @brief: writes the metadata of the tests, as returned by parse_test_metadata, in the student directory
+
+    @return Path: the path of the written file
+    """
+    path = Path(os.path.join(task.task_root, 'student', TEST_METADATA_NAME))
+    with open(path, 'w') as f:
+        json.dump(metadata, f, indent=2, sort_keys=True)
+    return path
+
+def load_test_metadata(task: TaskData) -> dict:
+    """
+    @brief: loads the metadata of the tests written by write_test_metadata, empty if the task was not calibrated
+    """
+    try:
+        with open(os.path.join(task.task_root, 'student', TEST_METADATA_NAME), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def record_test_stats(stats_path: Path, results: dict) -> Optional[dict]:
+    """
+    @brief: adds the outcome of a grading to the history of the tests of a task
+
+    The history is shared by the gradings of the node and updated under a file lock. Nothing is recorded
+    if STATE_DIR (the grand-parent directory of the default stats_path) does not exist.
+
+    @param stats_path: (Path) the history file, see task_stats_path
+    @param results: (dict) for each test name, a (passed, duration in seconds) tuple, as returned by parse_test_results
+
+    @return dict: the updated history, None if it could not be recorded
+    """
+    stats_dir = os.path.dirname(os.path.abspath(stats_path))
+    if not os.path.isdir(os.path.dirname(os.path.dirname(stats_dir))):
+        logger.debug(f"State directory of {stats_path} does not exist, the test history is not recorded")
+        return None
+    try:
+        os.makedirs(stats_dir, exist_ok=True)
+        with open(f"{stats_path}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            stats = load_test_stats(stats_path)
+            for test, (passed, duration) in results.items():
+                entry = stats.setdefault(test, {'runs': 0, 'failures': 0, 'duration': duration})
+                entry['runs'] += 1
+                entry['failures'] += 0 if passed else 1
+                entry['duration'] += DURATION_SMOOTHING * (duration - entry['duration'])
+            fd, tmp_path = tempfile.mkstemp(dir=stats_dir, prefix=f".{os.path.basename(stats_path)}.")
+            with os.fdopen(fd, 'w') as f:
+                json.dump(stats, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, stats_path)
+    except OSError as e:
+        logger.warning(f"Could not record the test history in {stats_path}: {e}")
+        return None
+    return stats
+
+def order_tests(stats: dict, tests: List[str]) -> List[str]:
+    """
+    @brief: orders the tests so that the cheapest and most frequently failing ones run first
+
+    Tests are sorted by decreasing failure rate per second. The failure rate is smoothed (Laplace) so that
+    tests without history count as failing half of the time, with the average duration of the known tests.
+
+    @param stats: (dict) the history of the tests, as returned by load_test_stats
+    @param tests: (List[str]) the test names, in source order
+
+    @return List[str]: the test names in running order, ties are kept in source order
+    """
+    durations = [entry['duration'] for entry in stats.values()]
+    default_duration = sum(durations) / len(durations) if durations else 1.0
+
+    def priority(test: str) -> float:
+        entry = stats.get(test, {'runs': 0, 'failures': 0, 'duration': default_duration})
+        failure_rate = (entry['failures'] + 1) / (entry['runs'] + 2)
+        return failure_rate / max(entry['duration'], 1e-3)
+    return sorted(tests, key=priority, reverse=True)
+
+def write_test_order(task: TaskData, order: List[str], fail_fast: bool=None) -> Path:
+    """
+    @brief: writes the order file read by CTester (TEST_ORDER=<file>) in the student directory
+
+    @param order: (List[str]) the test names in running order
+    @param fail_fast: (bool) stop at the first failed test, defaults to the fail_fast option of task.yaml
+
+    @return Path: the path of the written file
+    """
+    if fail_fast is None:
+        fail_fast = bool((task.task or {}).get('fail_fast', False))
+    path = Path(os.path.join(task.task_root, 'student', TEST_ORDER_NAME))
+    with open(path, 'w') as f:
+        for test in order:
+            f.write(f"{test}\n")
+        if fail_fast:
+            f.write("@fail-fast\n")
+    return path
+
+
+FEEDBACK_FILE = Path(os.environ.get('SUBMISSION_FEEDBACK', '/.__output/__feedback.json')) #Feedback file read by INGInious at the end of the grading
+
+class FeedbackBuffer:
+    """
+    Drop-in replacement for the setters of inginious.feedback that keeps the feedback in memory.
+
+    Every call to inginious.feedback re-reads and rewrites the feedback file, which becomes quadratic
+    for tasks giving feedback for hundreds of tests. This buffer reads the existing feedback once,
+    applies the same updates as inginious.feedback in memory, and writes the file atomically once in flush().
+    With flush_on_exit, flush() is also called when the interpreter exits (including exit() calls in
+    the run scripts) or receives SIGTERM, so that a killed grading still reports what it has.
+    When metrics is given, the global result and the tags set to True are also counted as grading outcomes,
+    each tag once per grading.
+    """
+    def __init__(self, path: Path=FEEDBACK_FILE, flush_on_exit: bool=True, metrics: 'GradingMetrics'=None):
+        self.path = Path(path)
+        self.metrics = metrics
+        self.feedback = {}
+        self.dirty = False
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.feedback = json.load(f)
+            except (OSError, ValueError):
+                logger.warning(f"Could not load existing feedback from {self.path}")
+        if flush_on_exit:
+            atexit.register(self.flush)
+            if signal.getsignal(signal.SIGTERM) != signal.SIG_IGN:
+                self._previous_sigterm = signal.signal(signal.SIGTERM, self._on_sigterm)
+
+    def _on_sigterm(self, signum, frame):
+        """Flushes the feedback, then exits through sys.exit so that the other atexit handlers (e.g. GradingMetrics) run"""
+        self.flush()
+        handler = self._previous_sigterm
+        if callable(handler):
+            handler(signum, frame)
+        sys.exit(128 + signum)
+
+    def set_global_result(self, result: str):
+        self.feedback['result'] = result
+        self.dirty = True
+        if self.metrics is not None:
+            self.metrics.set_result(result)
+
+    def set_problem_result(self, result: str, problem_id: str):
+        problems = self.feedback.setdefault('problems', {})
+        current = problems.get(problem_id, '')
+        problems[problem_id] = [result, current] if isinstance(current, str) else [result, current[1]]
+        self.dirty = True
+
+    def set_grade(self, grade: float):
+        self.feedback['grade'] = grade
+        self.dirty = True
+
+    def set_global_feedback(self, feedback: str, append: bool=False):
+        self.feedback['text'] = self.feedback.get('text', '') + feedback if append else feedback
+        self.dirty = True
+
+    def set_problem_feedback(self, feedback: str, problem_id: str, append: bool=False):
+        problems = self.feedback.setdefault('problems', {})
+        current = problems.get(problem_id, '')
+        if isinstance(current, list):
+            current[1] = current[1] + feedback if append else feedback
+        else:
+            problems[problem_id] = current + feedback if append else feedback
+        self.dirty = True
+
+    def set_tag(self, tag: str, value: bool):
+        tags = self.feedback.setdefault('tests', {})
+        if self.metrics is not None and value and not tags.get(tag):
+            self.metrics.outcome(tag)
+        tags[tag] = value
+        self.dirty = True
+
+    def set_custom_value(self, custom_name: str, custom_val: Any):
+        self.feedback.setdefault('custom', {})[custom_name] = custom_val
+        self.dirty = True
+
+    def flush(self) -> bool:
+        """
+        @brief: atomically writes the buffered feedback to the feedback file, if it changed since the last flush
+
+        @return boolean: True if the feedback file is up to date, False if it could not be written
+        """
+        if not self.dirty:
+            return True
+        tmp_path = None
+        try:
+            os.makedirs(self.path.parent, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.")
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.feedback, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Could not write feedback to {self.path}: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        self.dirty = False
+        return True
+
+
+
+METRICS_DIR = os.environ.get('JUDGE_METRICS_DIR', '/var/lib/node_exporter/textfile_collector') #Scraped by the node exporter
+METRICS_NAME = 'inginious_judges.prom'
+STAGE_BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120] #Upper bounds of the stage latency histogram, in seconds
+
+def _prometheus_labels(**labels) -> str:
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+class GradingMetrics:
+    """
+    Node-wide counters and stage latency histograms of the gradings, exported in the Prometheus text format.
+
+    Every grading runs in its own process, so the metrics of a grading are collected in memory and merged
+    into a node-local state file in flush(), under a file lock. The whole metrics file is then rewritten
+    atomically for the textfile collector of the node exporter. Nothing is written if the metrics directory
+    does not exist, so the judges run unchanged on nodes without exporter.
+
+    Exported metrics, all labelled by task:
+        inginious_judge_gradings_total{result}           gradings, by global result
+        inginious_judge_outcomes_total{outcome}          outcome tags (timeout, sigsegv, memory, not_compile, ...)
+                                                         set in the feedback, counted once per grading
+        inginious_judge_run_student_exits_total{code}    exit codes of run_student
+        inginious_judge_stage_duration_seconds{stage}    histogram of the duration of each stage
+    """
+    def __init__(self, task_id: str, metrics_dir: Path=None, flush_on_exit: bool=True):
+        self.task_id = task_id
+        self.metrics_dir = Path(metrics_dir or METRICS_DIR)
+        self.result = None
+        self.outcomes = []
+        self.exit_codes = []
+        self.durations = []
+        if flush_on_exit:
+            atexit.register(self.flush)
+
+    def set_result(self, result: str):
+        self.result = result
+
+    def outcome(self, outcome: str):
+        self.outcomes.append(outcome)
+
+    def exit_code(self, code: int):
+        """Counts an exit code of run_student, the outcome it stands for is counted from the tag set by the run script"""
+        self.exit_codes.append(code)
+
+    def observe(self, stage: str, seconds: float):
+        self.durations.append((stage, seconds))
+
+    @contextmanager
+    def stage(self, stage: str):
+        """Context manager measuring the duration of the enclosed block as the given stage"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.monotonic() - start)
+
+    def _merge(self, state: dict):
+        task = self.task_id
+        if self.result is not None:
+            results = state.setdefault('gradings', {}).setdefault(task, {})
+            results[self.result] = results.get(self.result, 0) + 1
+        outcomes = state.setdefault('outcomes', {}).setdefault(task, {})
+        for outcome in self.outcomes:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        exits = state.setdefault('exits', {}).setdefault(task, {})
+        for code in self.exit_codes:
+            exits[str(code)] = exits.get(str(code), 0) + 1
+        stages = state.setdefault('stages', {}).setdefault(task, {})
+        for stage, seconds in self.durations:
+            histogram = stages.setdefault(stage, {'buckets': [0] * len(STAGE_BUCKETS), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(STAGE_BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    @staticmethod
+    def render(state: dict) -> str:
+        """Renders a metrics state in the Prometheus text exposition format"""
+        lines = []
+        for name, key, label, help_text in (
+                ('inginious_judge_gradings_total', 'gradings', 'result', 'Gradings, by global result.'),
+                ('inginious_judge_outcomes_total', 'outcomes', 'outcome', 'Grading outcome tags.'),
+                ('inginious_judge_run_student_exits_total', 'exits', 'code', 'Exit codes of run_student.')):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for task, counts in sorted(state.get(key, {}).items()):
+                for value, count in sorted(counts.items()):
+                    lines.append(f"{name}{_prometheus_labels(task=task, **{label: value})} {count}")
+        name = 'inginious_judge_stage_duration_seconds'
+        lines.append(f"# HELP {name} Duration of the grading stages.")
+        lines.append(f"# TYPE {name} histogram")
+        for task, stages in sorted(state.get('stages', {}).items()):
+            for stage, histogram in sorted(stages.items()):
+                for bound, count in zip(STAGE_BUCKETS, histogram['buckets']):
+                    lines.append(f"{name}_bucket{_prometheus_labels(task=task, stage=stage, le=bound)} {count}")
+                lines.append(f"{name}_bucket{_prometheus_labels(task=task, stage=stage, le='+Inf')} {histogram['count']}")
+                lines.append(f"{name}_sum{_prometheus_labels(task=task, stage=stage)} {histogram['sum']}")
+                lines.append(f"{name}_count{_prometheus_labels(task=task, stage=stage)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self) -> bool:
+        """
+        @brief: merges the metrics of this grading into the node-wide metrics and rewrites the metrics file
+
+        @return boolean: True if the metrics were written (or there was nothing to write), False otherwise
+        """
+        if self.result is None and not (self.outcomes or self.exit_codes or self.durations):
+            return True
+        if not os.path.isdir(self.metrics_dir):
+            logger.debug(f"Metrics directory {self.metrics_dir} does not exist, metrics are not exported")
+            return False
+        metrics_path = os.path.join(self.metrics_dir, METRICS_NAME)
+        state_path = metrics_path + '.state.json'
+        try:
+            with open(metrics_path + '.lock', 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    with open(state_path, 'r') as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    state = {}
+                self._merge(state)
+                for path, content in ((state_path, json.dumps(state)), (metrics_path, self.render(state))):
+                    fd, tmp_path = tempfile.mkstemp(dir=self.metrics_dir, prefix='.tmp-')
+                    with os.fdopen(fd, 'w') as f:
+                        f.write(content)
+                    os.chmod(tmp_path, 0o644)
+                    os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Could not export the grading metrics to {metrics_path}: {e}")
+            return False
+        self.result = None
+        self.outcomes, self.exit_codes, self.durations = [], [], []
+        return True
 
 
 
@@ -291,7 +1078,28 @@ class FrameWorkBuilder:
         self.test_external = (command, fun)
 
     def build_framework(self):
-        def run_task(task_dir: Path):
-            
+        """
+        Returns a function running the configured steps on a task directory, in order. The steps without
+        command are skipped, and the run stops at the first step whose feedback function returns False.
+        The resources consumed by the steps that ran are written with write_resource_summary, even when
+        the run stops early.
+        """
+        steps = [
+            (student_code_pre_compile, self.pre_compile_pair),
+            (student_code_compile, self.compile_pair),
+            (student_code_post_compile, self.post_compile_pair),
+            (student_code_test_external, self.test_external),
+        ]
 
-    
\ No newline at end of file
+        def run_task(task_dir: Path, build_script: Path=None, lib_dirs: List[Path]=None) -> bool:
+            task = task_dir_to_TaskData(task_dir, build_script, lib_dirs)
+            try:
+                for step, (command, fun) in steps:
+                    if command is None:
+                        continue
+                    if step(task, command, fun) is False:
+                        return False
+                return True
+            finally:
+                write_resource_summary(task)
+        return run_task
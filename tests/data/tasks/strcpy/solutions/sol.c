@@ -1,4 +1,7 @@
 #include <stdlib.h>
+#include <string.h>
+
+#include "student_code.h"
 
 char *buf_strcpy(const char *src){
   int len = strlen(src) + 1, i;
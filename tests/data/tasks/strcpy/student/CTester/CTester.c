@@ -7,6 +7,7 @@
 #include <signal.h>
 #include <errno.h>
 #include <sys/time.h>
+#include <time.h>
 
 #include <CUnit/CUnit.h>
 #include <CUnit/Basic.h>
@@ -23,6 +24,10 @@
 #define TAGS_NB_MAX 20
 #define TAGS_LEN_MAX 30
 
+#define TEST_NAME_LEN_MAX 128
+#define BUDGETS_NB_MAX 256
+#define DEFAULT_BUDGET_MS 2000
+
 extern bool wrap_monitoring;
 extern struct wrap_stats_t stats;
 extern struct wrap_monitor_t monitored;
@@ -40,6 +45,27 @@ struct itimerval it_val;
 
 CU_pSuite pSuite = NULL;
 
+/* Per-test time budgets, read from the file given with TIME_BUDGETS=<file>.
+ * Each line of the file is <test name>#<milliseconds>, the name "*" sets the
+ * budget of the tests that are not listed. */
+struct time_budget {
+    char test[TEST_NAME_LEN_MAX];
+    long ms;
+};
+
+struct time_budget budgets[BUDGETS_NB_MAX];
+int nb_budgets = 0;
+long default_budget_ms = DEFAULT_BUDGET_MS;
+long current_budget_ms = DEFAULT_BUDGET_MS;
+
+/* Order in which the tests are run, read from the file given with TEST_ORDER=<file>.
+ * Each line of the file is a test name, the tests that are not listed run afterwards
+ * in source order. The line "@fail-fast" stops the run at the first failed test, the
+ * remaining tests are reported as NOT_RUN. */
+char test_order[BUDGETS_NB_MAX][TEST_NAME_LEN_MAX];
+int nb_test_order = 0;
+bool fail_fast = false;
+
 
 struct info_msg {
     char *msg;
@@ -122,11 +148,62 @@ void alarm_handler(int sig, siginfo_t *unused, void *unused2)
 }
 
 
+void load_time_budgets(const char *path)
+{
+    FILE *f = fopen(path, "r");
+    if (!f)
+        return;
+
+    char line[TEST_NAME_LEN_MAX + 32];
+    while (fgets(line, sizeof(line), f) != NULL) {
+        char *sep = strrchr(line, '#');
+        if (sep == NULL)
+            continue;
+        *sep = '\0';
+        long ms = strtol(sep + 1, NULL, 10);
+        if (ms <= 0)
+            continue;
+        if (!strcmp(line, "*"))
+            default_budget_ms = ms;
+        else if (nb_budgets < BUDGETS_NB_MAX) {
+            strncpy(budgets[nb_budgets].test, line, TEST_NAME_LEN_MAX - 1);
+            budgets[nb_budgets++].ms = ms;
+        }
+    }
+    fclose(f);
+}
+
+void load_test_order(const char *path)
+{
+    FILE *f = fopen(path, "r");
+    if (!f)
+        return;
+
+    char line[TEST_NAME_LEN_MAX];
+    while (fgets(line, sizeof(line), f) != NULL) {
+        line[strcspn(line, "\n")] = '\0';
+        if (!strcmp(line, "@fail-fast"))
+            fail_fast = true;
+        else if (line[0] != '\0' && nb_test_order < BUDGETS_NB_MAX)
+            strncpy(test_order[nb_test_order++], line, TEST_NAME_LEN_MAX - 1);
+    }
+    fclose(f);
+}
+
+long time_budget_ms(const char *test)
+{
+    for (int i=0; i < nb_budgets; i++) {
+        if (!strcmp(budgets[i].test, test))
+            return budgets[i].ms;
+    }
+    return default_budget_ms;
+}
+
 int sandbox_begin()
 {
     // Start timer
-    it_val.it_value.tv_sec = 2;
-    it_val.it_value.tv_usec = 0;
+    it_val.it_value.tv_sec = current_budget_ms / 1000;
+    it_val.it_value.tv_usec = (current_budget_ms % 1000) * 1000;
     it_val.it_interval.tv_sec = 0;
     it_val.it_interval.tv_usec = 0;
     setitimer(ITIMER_REAL, &it_val, NULL);
@@ -213,6 +290,10 @@ int run_tests(int argc, char *argv[], void *tests[], int nb_tests) {
     for (int i=1; i < argc; i++) {
         if (!strncmp(argv[i], "LANGUAGE=", 9))
                 putenv(argv[i]);
+        else if (!strncmp(argv[i], "TIME_BUDGETS=", 13))
+                load_time_budgets(argv[i] + 13);
+        else if (!strncmp(argv[i], "TEST_ORDER=", 11))
+                load_test_order(argv[i] + 11);
     }
     setlocale (LC_ALL, "");
     bindtextdomain("tests", getenv("PWD"));
@@ -266,6 +347,11 @@ int run_tests(int argc, char *argv[], void *tests[], int nb_tests) {
     if (!f_out)
         return -ENOENT;
 
+    /* Output file containing the duration of each test, used to calibrate the time budgets */
+    FILE* f_timings = fopen("timings.txt", "w");
+    if (!f_timings)
+        return -ENOENT;
+
 
     /* initialize the CUnit test registry */
     if (CUE_SUCCESS != CU_initialize_registry())
@@ -278,11 +364,40 @@ int run_tests(int argc, char *argv[], void *tests[], int nb_tests) {
         return CU_get_error();
     }
 
+    /* tests listed in the order file first, then the others in source order */
+    int order[nb_tests];
+    bool ordered[nb_tests];
+    int nb_ordered = 0;
+    memset(ordered, 0, sizeof(ordered));
+    for (int j=0; j < nb_test_order; j++) {
+        for (int i=0; i < nb_tests; i++) {
+            Dl_info DlInfo;
+            if (!ordered[i] && dladdr(tests[i], &DlInfo) != 0 && !strcmp(DlInfo.dli_sname, test_order[j])) {
+                ordered[i] = true;
+                order[nb_ordered++] = i;
+                break;
+            }
+        }
+    }
     for (int i=0; i < nb_tests; i++) {
+        if (!ordered[i])
+            order[nb_ordered++] = i;
+    }
+
+    bool stop = false;
+    for (int k=0; k < nb_tests; k++) {
+        int i = order[k];
         Dl_info  DlInfo;
         if (dladdr(tests[i], &DlInfo) == 0)
             return -EFAULT;
 
+        if (stop) {
+            ret = fprintf(f_out, "#NOT_RUN#%s#0#\n", DlInfo.dli_sname);
+            if (ret < 0)
+                return ret;
+            continue;
+        }
+
         CU_pTest pTest;
         if ((pTest = CU_add_test(pSuite, DlInfo.dli_sname, tests[i])) == NULL) {
                 CU_cleanup_registry();
@@ -292,14 +407,26 @@ int run_tests(int argc, char *argv[], void *tests[], int nb_tests) {
         printf("\n==== Results for test %s : ====\n", DlInfo.dli_sname);
 
         start_test();
+        current_budget_ms = time_budget_ms(DlInfo.dli_sname);
+
+        struct timespec test_start, test_end;
+        clock_gettime(CLOCK_MONOTONIC, &test_start);
 
         if (CU_basic_run_test(pSuite,pTest) != CUE_SUCCESS)
             return CU_get_error();
 
+        clock_gettime(CLOCK_MONOTONIC, &test_end);
+        ret = fprintf(f_timings, "%s#%.6f\n", DlInfo.dli_sname,
+                (test_end.tv_sec - test_start.tv_sec) + (test_end.tv_nsec - test_start.tv_nsec) / 1e9);
+        if (ret < 0)
+            return ret;
+
         if (test_metadata.err)
             return test_metadata.err;
 
         int nb = CU_get_number_of_tests_failed();
+        if (nb > 0 && fail_fast)
+            stop = true;
         if (nb > 0)
             ret = fprintf(f_out, "%s#FAIL#%s#%d#", test_metadata.problem,
                     test_metadata.descr, test_metadata.weight);
@@ -344,6 +471,7 @@ int run_tests(int argc, char *argv[], void *tests[], int nb_tests) {
     }
 
     fclose(f_out);
+    fclose(f_timings);
 
     /* Run all tests using the CUnit Basic interface */
     //CU_basic_run_tests();
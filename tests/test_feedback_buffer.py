@@ -0,0 +1,88 @@
+from task_common import FeedbackBuffer
+from pathlib import Path
+import unittest
+import tempfile
+import json
+import os
+import signal
+import subprocess
+import sys
+
+class FeedbackBufferTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(os.path.join(self.tmp_dir.name, '__feedback.json'))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_flush_once(self):
+        buffer = FeedbackBuffer(self.path, flush_on_exit=False)
+        buffer.set_global_result("success")
+        buffer.set_global_feedback("- Votre code compile.\n")
+        buffer.set_global_feedback("- Tests passés.", True)
+        for i in range(100):
+            buffer.set_problem_feedback(f"test {i}\n", "q1", True)
+            buffer.set_tag(f"tag{i % 3}", True)
+        buffer.set_problem_result("failed", "q1")
+        buffer.set_grade(50.0)
+        self.assertFalse(os.path.exists(self.path))
+
+        self.assertTrue(buffer.flush())
+        with open(self.path, 'r') as f:
+            written = json.load(f)
+        self.assertEqual(written['result'], "success")
+        self.assertEqual(written['text'], "- Votre code compile.\n- Tests passés.")
+        self.assertEqual(written['problems']['q1'][0], "failed")
+        self.assertEqual(written['problems']['q1'][1], "".join(f"test {i}\n" for i in range(100)))
+        self.assertEqual(written['tests'], {'tag0': True, 'tag1': True, 'tag2': True})
+        self.assertEqual(written['grade'], 50.0)
+        self.assertEqual(os.listdir(self.tmp_dir.name), ['__feedback.json'])
+
+    def test_existing_feedback(self):
+        with open(self.path, 'w') as f:
+            json.dump({'result': 'failed', 'text': 'before'}, f)
+        buffer = FeedbackBuffer(self.path, flush_on_exit=False)
+        buffer.set_global_feedback(" after", True)
+        buffer.flush()
+        with open(self.path, 'r') as f:
+            written = json.load(f)
+        self.assertEqual(written, {'result': 'failed', 'text': 'before after'})
+
+    def test_missing_directory(self):
+        path = Path(os.path.join(self.tmp_dir.name, '.__output', '__feedback.json'))
+        buffer = FeedbackBuffer(path, flush_on_exit=False)
+        buffer.set_global_result("failed")
+        self.assertTrue(buffer.flush())
+        with open(path, 'r') as f:
+            self.assertEqual(json.load(f), {'result': 'failed'})
+
+    def test_sigterm(self):
+        # A killed grading still writes its feedback, and the other atexit handlers (the metrics) still run
+        script = (
+            "import sys, time\n"
+            "from task_common import FeedbackBuffer, GradingMetrics\n"
+            f"metrics = GradingMetrics('strcpy', {self.tmp_dir.name!r})\n"
+            f"buffer = FeedbackBuffer({str(self.path)!r}, metrics=metrics)\n"
+            "buffer.set_global_result('failed')\n"
+            "print('ready', flush=True)\n"
+            "time.sleep(30)\n"
+        )
+        env = dict(os.environ, PYTHONPATH=os.path.abspath('.'))
+        p = subprocess.Popen([sys.executable, '-c', script], stdout=subprocess.PIPE, env=env)
+        self.assertEqual(p.stdout.readline().strip(), b'ready')
+        p.send_signal(signal.SIGTERM)
+        p.communicate(timeout=10)
+        self.assertEqual(p.returncode, 128 + signal.SIGTERM)
+        with open(self.path, 'r') as f:
+            self.assertEqual(json.load(f), {'result': 'failed'})
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, 'inginious_judges.prom')))
+
+    def test_sigterm_ignored(self):
+        previous = signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        try:
+            FeedbackBuffer(self.path)
+            self.assertEqual(signal.getsignal(signal.SIGTERM), signal.SIG_IGN)
+        finally:
+            signal.signal(signal.SIGTERM, previous)
@@ -0,0 +1,65 @@
+from task_common import task_dir_to_TaskData, task_id, task_stats_path, load_test_stats, parse_test_results, record_test_stats, order_tests, write_test_order
+from pathlib import Path
+import unittest
+import tempfile
+import os
+test_data_path = os.path.join('.', 'tests', 'data')
+task_root = Path(os.path.join(test_data_path, 'tasks', 'strcpy'))
+
+class HistoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.stats_path = Path(os.path.join(self.tmp_dir.name, 'tasks', 'strcpy', 'stats.json'))
+        self.task_data = task_dir_to_TaskData(task_root)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_parse_test_results(self):
+        results_path = os.path.join(self.tmp_dir.name, 'results.txt')
+        timings_path = os.path.join(self.tmp_dir.name, 'timings.txt')
+        with open(results_path, 'w') as f:
+            f.write("strcpy_impl#SUCCESS#Check the copy#1##\nstrcpy_impl#FAIL#Check malloc#1#malloc_fail#Info\n#NOT_RUN#test_c#0#\n")
+        with open(timings_path, 'w') as f:
+            f.write("test_a#0.010000\ntest_b#0.500000\n")
+        self.assertEqual(parse_test_results(results_path, timings_path), {'test_a': (True, 0.01), 'test_b': (False, 0.5)})
+
+    def test_record_test_stats(self):
+        self.assertEqual(load_test_stats(self.stats_path), {})
+        record_test_stats(self.stats_path, {'test_a': (True, 1.0), 'test_b': (False, 0.5)})
+        stats = record_test_stats(self.stats_path, {'test_a': (False, 2.0)})
+        self.assertEqual(stats['test_a']['runs'], 2)
+        self.assertEqual(stats['test_a']['failures'], 1)
+        self.assertAlmostEqual(stats['test_a']['duration'], 1.2)
+        self.assertEqual(load_test_stats(self.stats_path), stats)
+
+    def test_missing_state_directory(self):
+        stats_path = Path(os.path.join(self.tmp_dir.name, 'missing', 'tasks', 'strcpy', 'stats.json'))
+        self.assertIsNone(record_test_stats(stats_path, {'test_a': (True, 1.0)}))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir.name, 'missing')))
+
+    def test_task_stats_path(self):
+        self.assertEqual(task_id(self.task_data.task), 'syst/strcpy')
+        self.assertEqual(task_stats_path(self.task_data.task).parent.name, 'syst_strcpy')
+        # Without explicit id, the display name of the task, with a warning
+        with self.assertLogs('JudgeAPI', level='WARNING'):
+            self.assertEqual(task_id({'name': '[S3] Improved strcpy'}), '[S3] Improved strcpy')
+        self.assertEqual(task_stats_path({'name': '[S3] Improved strcpy'}).parent.name, 'S3_Improved_strcpy')
+
+    def test_order_tests(self):
+        stats = {
+            'slow_failing': {'runs': 10, 'failures': 8, 'duration': 10.0},
+            'fast_failing': {'runs': 10, 'failures': 8, 'duration': 0.1},
+            'fast_passing': {'runs': 10, 'failures': 0, 'duration': 0.1},
+        }
+        self.assertEqual(order_tests(stats, ['slow_failing', 'fast_passing', 'fast_failing']), ['fast_failing', 'fast_passing', 'slow_failing'])
+        self.assertEqual(order_tests({}, ['test_b', 'test_a']), ['test_b', 'test_a'])
+
+    def test_write_test_order(self):
+        path = write_test_order(self.task_data, ['test_b', 'test_a'], fail_fast=True)
+        try:
+            with open(path, 'r') as f:
+                self.assertEqual(f.read().splitlines(), ['test_b', 'test_a', '@fail-fast'])
+        finally:
+            os.remove(path)
@@ -0,0 +1,77 @@
+from importlib.machinery import SourceFileLoader
+from importlib.util import spec_from_loader, module_from_spec
+import signal
+import subprocess
+import time
+import unittest
+import os
+import sys
+local_path = os.path.join('.', 'local')
+
+def load_module(name: str, path: str):
+    spec = spec_from_loader(name, SourceFileLoader(name, path))
+    mod = module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+run_student = load_module('run_student', os.path.join(local_path, 'run_student'))
+load_generator = load_module('load_generator', os.path.join(local_path, 'load_generator.py'))
+
+class RunStudentTestCase(unittest.TestCase):
+
+    def test_exit_code(self):
+        self.assertEqual(run_student.exit_code(0, False, False), 0)
+        self.assertEqual(run_student.exit_code(3, False, False), 3)
+        self.assertEqual(run_student.exit_code(-signal.SIGSEGV, False, False), 256-11)
+        self.assertEqual(run_student.exit_code(-signal.SIGFPE, False, False), 256-8)
+        self.assertEqual(run_student.exit_code(-signal.SIGKILL, True, False), 253)
+        self.assertEqual(run_student.exit_code(-signal.SIGXCPU, False, False), 253)
+        self.assertEqual(run_student.exit_code(-signal.SIGKILL, False, True), 252)
+
+    def test_memory(self):
+        command = [sys.executable, os.path.join(local_path, 'run_student'), '--memory', '50', sys.executable, '-c']
+        # Resident memory is limited, not the address space: reserving a large mapping is allowed
+        p = subprocess.run(command + ['import mmap; m = mmap.mmap(-1, 1 << 30); import time; time.sleep(0.2)'])
+        self.assertEqual(p.returncode, 0)
+        p = subprocess.run(command + ['x = bytearray(200 * 1024 * 1024); import time; time.sleep(1)'])
+        self.assertEqual(p.returncode, 252)
+
+    def test_hard_time(self):
+        p = subprocess.run([sys.executable, os.path.join(local_path, 'run_student'), '--time', '5', '--hard-time', '1', 'sleep', '10'])
+        self.assertEqual(p.returncode, 253)
+
+    def test_signal(self):
+        p = subprocess.run([sys.executable, os.path.join(local_path, 'run_student'), 'sh', '-c', 'kill -SEGV $$'])
+        self.assertEqual(p.returncode, 256-11)
+
+
+class LoadGeneratorTestCase(unittest.TestCase):
+
+    def test_percentile(self):
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual(load_generator.percentile(values, 50), 50.0)
+        self.assertEqual(load_generator.percentile(values, 99), 99.0)
+        self.assertEqual(load_generator.percentile([], 50), 0.0)
+
+    def test_load_submission(self):
+        path = os.path.join('.', 'tests', 'data', 'tasks', 'strcpy', 'test', 'submission1.test')
+        submission = load_generator.load_submission(load_generator.Path(path))
+        self.assertEqual(submission.task_dir.name, 'strcpy')
+        self.assertIn('strcpy_impl', submission.input)
+
+    def test_grade(self):
+        # End to end: the strcpy run script, with the local inginious package and run_student
+        path = os.path.join('.', 'tests', 'data', 'tasks', 'strcpy', 'test', 'submission1.test')
+        submission = load_generator.load_submission(load_generator.Path(path))
+        result = load_generator.grade(submission, f"{sys.executable} run", time.monotonic(), False)
+        self.assertIsNone(result.error)
+        self.assertEqual(result.returncode, 0)
+        self.assertIn(result.result, ('success', 'failed'))
+
+    def test_grade_failure(self):
+        path = os.path.join('.', 'tests', 'data', 'tasks', 'strcpy', 'test', 'submission1.test')
+        submission = load_generator.load_submission(load_generator.Path(path))
+        result = load_generator.grade(submission, "sh -c 'exit 3'", time.monotonic(), False)
+        self.assertTrue(result.failed)
+        self.assertEqual(result.returncode, 3)
+
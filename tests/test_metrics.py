@@ -0,0 +1,56 @@
+from task_common import GradingMetrics, FeedbackBuffer, METRICS_NAME
+from pathlib import Path
+import unittest
+import tempfile
+import os
+
+class GradingMetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.metrics_path = os.path.join(self.tmp_dir.name, METRICS_NAME)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read_metrics(self):
+        with open(self.metrics_path, 'r') as f:
+            return f.read().splitlines()
+
+    def test_flush_accumulates(self):
+        for _ in range(2):
+            metrics = GradingMetrics('strcpy', Path(self.tmp_dir.name), flush_on_exit=False)
+            metrics.set_result('failed')
+            metrics.exit_code(253)
+            metrics.observe('compile', 0.3)
+            self.assertTrue(metrics.flush())
+        lines = self.read_metrics()
+        self.assertIn('inginious_judge_gradings_total{task="strcpy",result="failed"} 2', lines)
+        # The outcome of an exit code is counted from the tag set by the run script, not from the code
+        self.assertFalse([line for line in lines if line.startswith('inginious_judge_outcomes_total{')])
+        self.assertIn('inginious_judge_run_student_exits_total{task="strcpy",code="253"} 2', lines)
+        self.assertIn('inginious_judge_stage_duration_seconds_bucket{task="strcpy",stage="compile",le="0.25"} 0', lines)
+        self.assertIn('inginious_judge_stage_duration_seconds_bucket{task="strcpy",stage="compile",le="0.5"} 2', lines)
+        self.assertIn('inginious_judge_stage_duration_seconds_bucket{task="strcpy",stage="compile",le="+Inf"} 2', lines)
+        self.assertIn('inginious_judge_stage_duration_seconds_count{task="strcpy",stage="compile"} 2', lines)
+
+    def test_feedback_buffer_outcomes(self):
+        metrics = GradingMetrics('strcpy', Path(self.tmp_dir.name), flush_on_exit=False)
+        buffer = FeedbackBuffer(Path(os.path.join(self.tmp_dir.name, 'feedback.json')), flush_on_exit=False, metrics=metrics)
+        buffer.set_tag("not_compile", True)
+        buffer.set_tag("not_compile", True)
+        buffer.set_tag("sigsegv", False)
+        buffer.set_global_result("failed")
+        with metrics.stage('make'):
+            pass
+        metrics.flush()
+        lines = self.read_metrics()
+        self.assertIn('inginious_judge_outcomes_total{task="strcpy",outcome="not_compile"} 1', lines)
+        self.assertNotIn('inginious_judge_outcomes_total{task="strcpy",outcome="sigsegv"} 1', lines)
+        self.assertIn('inginious_judge_gradings_total{task="strcpy",result="failed"} 1', lines)
+        self.assertIn('inginious_judge_stage_duration_seconds_count{task="strcpy",stage="make"} 1', lines)
+
+    def test_missing_directory(self):
+        metrics = GradingMetrics('strcpy', Path(os.path.join(self.tmp_dir.name, 'missing')), flush_on_exit=False)
+        metrics.outcome('timeout')
+        self.assertFalse(metrics.flush())
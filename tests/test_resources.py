@@ -0,0 +1,58 @@
+from task_common import task_dir_to_TaskData, student_code_pre_compile, student_code_compile, write_resource_summary
+from pathlib import Path
+import unittest
+import tempfile
+import json
+import os
+import sys
+test_data_path = os.path.join('.', 'tests', 'data')
+task_root = Path(os.path.join(test_data_path, 'tasks', 'strcpy'))
+
+class ResourcesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.task_data = task_dir_to_TaskData(task_root)
+
+    def test_stage_resources(self):
+        received = []
+
+        def check_and_feedback(returncode: int, output: str, resources):
+            received.append((returncode, output, resources))
+            return returncode == 0
+
+        command = f"{sys.executable} -c \"x = bytearray(64 * 1024 * 1024); print('done')\""
+        self.assertTrue(student_code_pre_compile(self.task_data, command, check_and_feedback, with_resources=True))
+        returncode, output, resources = received[0]
+        self.assertEqual(returncode, 0)
+        self.assertEqual(output.strip(), 'done')
+        self.assertEqual(resources.stage, 'pre_compile')
+        self.assertGreaterEqual(resources.max_rss, 64 * 1024 * 1024)
+        self.assertGreater(resources.wall_time, 0)
+        self.assertEqual(self.task_data.resources, [resources])
+
+    def test_two_arguments_feedback(self):
+        received = []
+        self.assertFalse(student_code_compile(self.task_data, "sh -c 'exit 3'", lambda code, output: received.append(code)))
+        self.assertEqual(received, [3])
+        self.assertEqual(self.task_data.resources[0].stage, 'compile')
+
+    def test_optional_arguments_feedback(self):
+        # A third optional argument of the feedback function does not receive the resources unless asked for
+        received = []
+
+        def check_and_feedback(code, out, lib=None, libs=None):
+            received.append((code, lib, libs))
+            return code == 0
+
+        self.assertTrue(student_code_compile(self.task_data, "true", check_and_feedback))
+        self.assertEqual(received, [(0, None, None)])
+
+    def test_write_resource_summary(self):
+        student_code_pre_compile(self.task_data, "true", lambda code, output: True)
+        student_code_compile(self.task_data, "true", lambda code, output: True)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = write_resource_summary(self.task_data, Path(os.path.join(tmp_dir, 'resources.json')))
+            with open(path, 'r') as f:
+                summary = json.load(f)
+        self.assertEqual([stage['stage'] for stage in summary['stages']], ['pre_compile', 'compile'])
+        self.assertAlmostEqual(summary['total']['wall_time'], sum(stage['wall_time'] for stage in summary['stages']))
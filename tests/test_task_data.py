@@ -1,6 +1,9 @@
-from task_common import TaskData, task_dir_to_TaskData, student_code_generate, student_code_validate
+from task_common import TaskData, task_dir_to_TaskData, student_code_generate, student_code_validate, FrameWorkBuilder
 from pathlib import Path
 import unittest
+import tempfile
+import shutil
+import json
 import os
 import sys
 project_root = os.path.dirname(sys.modules['__main__'].__file__)
@@ -67,4 +70,20 @@ class TaskDataTestCase(unittest.TestCase):
         finally:
             os.remove(student_file_path)
 
-        
+    def test_build_framework(self):
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            task_root = os.path.join(tmp_dir, 'strcpy')
+            shutil.copytree(task_dirs[0]['root'], task_root)
+            called = []
+            builder = FrameWorkBuilder()
+            builder.set_pre_compile_pair("true", lambda code, output: called.append('pre_compile') or code == 0)
+            builder.set_compile_pair("false", lambda code, output: called.append('compile') or code == 0)
+            builder.set_test_external("true", lambda code, output: called.append('test_external') or code == 0)
+            run_task = builder.build_framework()
+            self.assertFalse(run_task(Path(task_root)))
+            self.assertEqual(called, ['pre_compile', 'compile'])
+            # The resources of the steps that ran are recorded even if the run stopped early
+            with open(os.path.join(task_root, 'student', 'resources.json'), 'r') as f:
+                summary = json.load(f)
+            self.assertEqual([stage['stage'] for stage in summary['stages']], ['pre_compile', 'compile'])
@@ -0,0 +1,60 @@
+from task_common import task_dir_to_TaskData, student_code_generate, template_compile, template_render, compiled_template, template_generator
+from pathlib import Path
+import unittest
+import tempfile
+import json
+import os
+test_data_path = os.path.join('.', 'tests', 'data')
+task_root = Path(os.path.join(test_data_path, 'tasks', 'strcpy'))
+
+class TemplateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = Path(os.path.join(self.tmp_dir.name, 'templates'))
+        self.task_data = task_dir_to_TaskData(task_root)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_template_compile(self):
+        template_path = os.path.join(self.tmp_dir.name, 'code.c.tpl')
+        with open(template_path, 'w') as f:
+            f.write("int main() {\n@    @body@;@\n}\n// @@other@@\n")
+        segments = template_compile(Path(template_path))
+        self.assertEqual(segments, ["int main() {\n", ["    ", "body", ";"], "\n}\n// ", ["", "other", ""], "\n"])
+        self.assertEqual(template_render(segments, {'body': "a = 1\nb = 2"}), "int main() {\n    a = 1;\n    b = 2;\n}\n// @@other@@\n")
+        self.assertEqual(template_compile(Path(template_path), ['other']), ["int main() {\n@    @body@;@\n}\n// ", ["", "other", ""], "\n"])
+
+    def test_compiled_template_cached(self):
+        template_path = os.path.join(self.tmp_dir.name, 'code.c.tpl')
+        with open(template_path, 'w') as f:
+            f.write("int main() {\n@@body@@\n}\n")
+        segments = compiled_template(Path(template_path), ['body'], self.cache_dir)
+        self.assertEqual(segments, ["int main() {\n", ["", "body", ""], "\n}\n"])
+        cached = os.listdir(self.cache_dir)
+        self.assertEqual(len(cached), 1)
+        with open(os.path.join(self.cache_dir, cached[0]), 'r') as f:
+            self.assertEqual(json.load(f), segments)
+        # A copy of the template in another task directory uses the same cache entry
+        copy_path = os.path.join(self.tmp_dir.name, 'copy.c.tpl')
+        with open(copy_path, 'w') as f:
+            f.write("int main() {\n@@body@@\n}\n")
+        self.assertEqual(compiled_template(Path(copy_path), ['body'], self.cache_dir), segments)
+        self.assertEqual(os.listdir(self.cache_dir), cached)
+        # Another content is another entry
+        with open(template_path, 'a') as f:
+            f.write("// end\n")
+        self.assertEqual(compiled_template(Path(template_path), ['body'], self.cache_dir)[-1], "\n}\n// end\n")
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_template_generator(self):
+        code = "return NULL;"
+        student_code_generate(self.task_data, template_generator(self.task_data, {'strcpy_impl': code}, self.cache_dir))
+        try:
+            with open(self.task_data.student_code, 'r') as f:
+                generated = f.read()
+            self.assertIn("char *buf_strcpy(const char *src) {\n  return NULL;\n}", generated)
+            self.assertNotIn("@@", generated)
+        finally:
+            os.remove(self.task_data.student_code)
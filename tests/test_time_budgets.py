@@ -0,0 +1,99 @@
+from task_common import task_dir_to_TaskData, task_version, calibrate_time_budgets, derive_time_budgets, write_time_budgets, prepare_time_budgets, write_test_order, load_test_metadata
+from pathlib import Path
+import unittest
+import tempfile
+import shutil
+import os
+test_data_path = os.path.join('.', 'tests', 'data')
+task_root = Path(os.path.join(test_data_path, 'tasks', 'strcpy'))
+
+class TimeBudgetsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.manifest_path = Path(os.path.join(self.tmp_dir.name, 'manifest.json'))
+        self.task_data = task_dir_to_TaskData(task_root)
+        # Stands for the CTester binary: checks the reference replaced the student code and writes the results and timings
+        self.run_command = f"sh {os.path.join(self.tmp_dir.name, 'tests.sh')}"
+        with open(os.path.join(self.tmp_dir.name, 'tests.sh'), 'w') as f:
+            f.write("grep -q buf_strcpy student_code.c || exit 1\n"
+                    "printf 'strcpy_impl#SUCCESS#Check the copy#1##\\nstrcpy_impl#SUCCESS#Check malloc#2##\\n' > results.txt\n"
+                    "printf 'test_a#0.010000\\ntest_b#0.400000\\n' > timings.txt\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_derive_time_budgets(self):
+        per_test, run_budget = derive_time_budgets({'test_a': 0.01, 'test_b': 1.0}, factor=5.0, floor=0.5, run_floor=5.0)
+        self.assertEqual(per_test, {'test_a': 0.5, 'test_b': 5.0})
+        self.assertAlmostEqual(run_budget, 10.05)
+
+    def test_fast_tests_budgets(self):
+        # Many fast tests: the calibrated limits stay under the fixed --time 20 --hard-time 60 of the run scripts
+        for nb_tests in (10, 30, 1000):
+            timings = {f"test_{i}": 0.01 for i in range(nb_tests)}
+            per_test, run_budget = derive_time_budgets(timings)
+            self.assertTrue(all(budget < 2.0 for budget in per_test.values()))
+            self.assertLessEqual(run_budget, 20)
+            path = write_time_budgets(self.task_data, per_test, run_budget)
+            try:
+                with open(path, 'r') as f:
+                    budgets = dict(line.rsplit('#', 1) for line in f.read().splitlines())
+            finally:
+                os.remove(path)
+            self.assertLessEqual(int(budgets['@time']), 20000)
+            self.assertLessEqual(int(budgets['@hard-time']), 60000)
+        self.assertEqual(derive_time_budgets({f"test_{i}": 0.01 for i in range(10)})[1], 5.5)
+
+    def test_calibrate_time_budgets(self):
+        timings = calibrate_time_budgets(self.task_data, build_command="true", run_command=self.run_command, manifest_path=self.manifest_path)
+        self.assertEqual(timings, {'test_a': 0.01, 'test_b': 0.4})
+        # Cached in the manifest for this task version, the commands are not run again
+        timings = calibrate_time_budgets(self.task_data, build_command="false", run_command="false", manifest_path=self.manifest_path)
+        self.assertEqual(timings, {'test_a': 0.01, 'test_b': 0.4})
+        self.assertFalse(os.path.exists(os.path.join(task_root, 'student', 'student_code.c')))
+
+    def test_calibrate_failure(self):
+        self.assertIsNone(calibrate_time_budgets(self.task_data, build_command="false", manifest_path=self.manifest_path))
+        self.assertFalse(os.path.exists(self.manifest_path))
+
+    def test_write_time_budgets(self):
+        path = write_time_budgets(self.task_data, {'test_a': 0.5, 'test_b': 1.0001}, 6.5)
+        try:
+            with open(path, 'r') as f:
+                lines = f.read().splitlines()
+            self.assertEqual(lines, ['test_a#500', 'test_b#1001', '@time#7000', '@hard-time#14000'])
+        finally:
+            os.remove(path)
+
+    def test_task_version(self):
+        task_copy = Path(os.path.join(self.tmp_dir.name, 'strcpy'))
+        shutil.copytree(task_root, task_copy)
+        task_data = task_dir_to_TaskData(task_copy)
+        version = task_version(task_data)
+        # Files written by the calibration and the gradings do not change the version
+        write_time_budgets(task_data, {'test_a': 0.5}, 6.5)
+        write_test_order(task_data, ['test_a'])
+        for name in ('.task_manifest.json', '.task_stats.json'):
+            with open(os.path.join(task_copy, name), 'w') as f:
+                f.write("{}")
+        self.assertEqual(task_version(task_data), version)
+        with open(os.path.join(task_copy, 'student', 'tests.c'), 'a') as f:
+            f.write("\n")
+        self.assertNotEqual(task_version(task_data), version)
+
+    def test_prepare_time_budgets(self):
+        task_copy = Path(os.path.join(self.tmp_dir.name, 'strcpy'))
+        shutil.copytree(task_root, task_copy)
+        with open(os.path.join(task_copy, 'task.yaml'), 'a') as f:
+            f.write("time_budget_floor: 1.0\n")
+        task_data = task_dir_to_TaskData(task_copy)
+        path = prepare_time_budgets(task_data, build_command="true", run_command=self.run_command)
+        with open(path, 'r') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines, ['test_a#1000', 'test_b#2000', '@time#8000', '@hard-time#16000'])
+        # The metadata of the tests, for the tests skipped in fail-fast mode
+        self.assertEqual(load_test_metadata(task_data), {'test_a': {'pid': 'strcpy_impl', 'desc': 'Check the copy', 'weight': 1},
+                                                         'test_b': {'pid': 'strcpy_impl', 'desc': 'Check malloc', 'weight': 2}})
+        # The budgets file does not change the task version, the calibration is not run again
+        self.assertEqual(prepare_time_budgets(task_data, build_command="false", run_command="false"), path)